@@ -0,0 +1,639 @@
+import heapq
+import re
+import struct
+from array import array
+from collections import deque
+from collections.abc import Sequence
+
+from Frontier import BinaryHeap
+from SearchWorkspace import SearchWorkspace
+
+INF = float('inf')
+
+# Formato binário dos ficheiros (snapshot, hierarquias): cabeçalho, tabela de secções e secções alinhadas a 8 bytes
+SNAPSHOT_MAGIC = b'IAGRAFO\0'
+SNAPSHOT_VERSION = 2
+_HEADER = struct.Struct('<8sII')  # magic, versão, número de secções
+_SECTION = struct.Struct('<8sQQ')  # nome, offset, tamanho em bytes
+
+# Tolerâncias (nas unidades das coordenadas, graus) dos níveis de detalhe das geometrias; o nível 0 é a
+# geometria original e cada nível seguinte tem menos pontos (aprox. 1 m, 5 m e 20 m)
+NIVEIS_DETALHE = (0.0, 0.00001, 0.00005, 0.0002)
+
+
+# Serializa secções (nome, bytes ou array) num único blob binário versionado
+def pack_sections(magic, version, sections):
+    blobs = [data if isinstance(data, bytes) else bytes(memoryview(data).cast('B')) for _, data in sections]
+
+    table = []
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    for (name, _), blob in zip(sections, blobs):
+        offset += -offset % 8
+        table.append(_SECTION.pack(name, offset, len(blob)))
+        offset += len(blob)
+
+    out = bytearray(_HEADER.pack(magic, version, len(sections)))
+    for entry in table:
+        out += entry
+    for blob in blobs:
+        out += bytes(-len(out) % 8)
+        out += blob
+    return bytes(out)
+
+
+# Devolve {nome: memoryview} sobre o buffer, sem copiar os dados. Um buffer truncado (ex.: escrita
+# interrompida) dá ValueError
+def unpack_sections(buffer, magic, version):
+    buffer = memoryview(buffer)
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Ficheiro truncado.")
+    found_magic, found_version, count = _HEADER.unpack_from(buffer, 0)
+    if found_magic != magic:
+        raise ValueError("Ficheiro com formato desconhecido.")
+    if found_version != version:
+        raise ValueError(f"Versão do ficheiro não suportada: {found_version}.")
+
+    if _HEADER.size + count * _SECTION.size > len(buffer):
+        raise ValueError("Ficheiro truncado.")
+    sections = {}
+    for k in range(count):
+        name, offset, size = _SECTION.unpack_from(buffer, _HEADER.size + k * _SECTION.size)
+        if offset + size > len(buffer):
+            raise ValueError("Ficheiro truncado.")
+        sections[name.rstrip(b'\0')] = buffer[offset:offset + size]
+    return sections
+
+
+# Simplificação de Douglas-Peucker de uma linha: remove os pontos a menos de tolerancia do segmento
+# entre os pontos mantidos. As pontas são sempre mantidas.
+def douglas_peucker(points, tolerancia):
+    if len(points) <= 2 or tolerancia <= 0:
+        return list(points)
+    manter = [False] * len(points)
+    manter[0] = manter[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = points[first], points[last]
+        dx, dy = x2 - x1, y2 - y1
+        norma = dx * dx + dy * dy
+        pior, pior_dist = -1, tolerancia
+        for k in range(first + 1, last):
+            x, y = points[k]
+            if norma == 0:
+                dist = ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+            else:
+                dist = abs(dy * (x - x1) - dx * (y - y1)) / norma ** 0.5
+            if dist > pior_dist:
+                pior, pior_dist = k, dist
+        if pior >= 0:
+            manter[pior] = True
+            stack.append((first, pior))
+            stack.append((pior, last))
+    return [point for point, m in zip(points, manter) if m]
+
+
+# Geometrias guardadas como coordenadas empacotadas; cada estrada r ocupa os pares
+# offsets[r]..offsets[r + 1] de coords. Devolve a geometria em WKT para manter a interface antiga.
+# As versões simplificadas (ver NIVEIS_DETALHE) são calculadas uma vez, no primeiro pedido.
+class PackedGeometries(Sequence):
+    def __init__(self, offsets, coords):
+        self.offsets = offsets
+        self.coords = coords
+        self._niveis = {0: self}
+
+    @staticmethod
+    def pack(geometries):
+        offsets = array('i', [0])
+        coords = array('d')
+        for geometry in geometries:
+            for x, y in re.findall(r"(\-?\d+\.\d+)\s+(\-?\d+\.\d+)", geometry or ''):
+                coords.append(float(x))
+                coords.append(float(y))
+            offsets.append(len(coords) // 2)
+        return PackedGeometries(offsets, coords)
+
+    def points(self, r):
+        coords = self.coords
+        return [(coords[2 * k], coords[2 * k + 1]) for k in range(self.offsets[r], self.offsets[r + 1])]
+
+    # Número de pontos da estrada r
+    def size(self, r):
+        return self.offsets[r + 1] - self.offsets[r]
+
+    def simplificar(self, tolerancia):
+        offsets = array('i', [0])
+        coords = array('d')
+        for r in range(len(self)):
+            for x, y in douglas_peucker(self.points(r), tolerancia):
+                coords.append(x)
+                coords.append(y)
+            offsets.append(len(coords) // 2)
+        return PackedGeometries(offsets, coords)
+
+    # Geometrias com o nível de detalhe indicado (índice de NIVEIS_DETALHE)
+    def nivel(self, nivel):
+        if nivel not in self._niveis:
+            self._niveis[nivel] = self.simplificar(NIVEIS_DETALHE[nivel])
+        return self._niveis[nivel]
+
+    def __getitem__(self, r):
+        points = self.points(r)
+        if not points:
+            return ''
+        return 'LINESTRING (' + ', '.join(f'{x!r} {y!r}' for x, y in points) + ')'
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+# Representação compacta (compressed sparse row) e imutável da topologia do grafo.
+# Os nós são índices inteiros; as arestas de saída do nó i ocupam as posições
+# offsets[i]..offsets[i + 1] dos arrays por aresta (targets, lengths, ...).
+# Cada estrada do CSV dá origem a duas arestas (ida e volta), tal como Graph.add_edge; com
+# sentido_unico, as estradas de sentido único só têm a aresta de ida.
+class CSRGraph:
+    def __init__(self, ids, xs, ys, offsets, targets, lengths, arc_road, arc_reverse,
+                 road_oneway, road_name, names, geometries, sentido_unico=False):
+        # Nós. ids pode ser uma lista ou os bytes da secção do snapshot (IDs separados por '\0'),
+        # descodificados só no primeiro acesso para que abrir um grafo não dependa do seu tamanho
+        self._ids = ids  # índice -> ID (string)
+        self._index = None  # ID -> índice
+        self.xs = xs
+        self.ys = ys
+        # Arestas (uma entrada por sentido)
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.arc_road = arc_road  # aresta -> estrada original
+        self.arc_reverse = arc_reverse  # 1 se a aresta percorre a estrada no sentido inverso
+        # Estradas (uma entrada por linha do CSV)
+        self.road_oneway = road_oneway
+        self.road_name = road_name  # estrada -> índice em names
+        self.names = names
+        self.geometries = geometries
+        self.sentido_unico = sentido_unico
+        self._reverse = None
+        self._workspace = None
+
+    @property
+    def ids(self):
+        if not isinstance(self._ids, list):
+            data = bytes(self._ids)
+            self._ids = data.decode('utf-8').split('\0') if data else []
+        return self._ids
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {node_id: i for i, node_id in enumerate(self.ids)}
+        return self._index
+
+    @property
+    def num_nodes(self):
+        return len(self.xs)
+
+    @property
+    def num_arcs(self):
+        return len(self.targets)
+
+    @property
+    def num_roads(self):
+        return len(self.road_oneway)
+
+    @staticmethod
+    def build(node_ids, coordinates, roads, sentido_unico=False):
+        # roads: lista de (u, v, oneway, length, geometry, name) pela ordem de inserção
+        ids = list(node_ids)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        n = len(ids)
+
+        xs = array('d', (c[0] for c in coordinates))
+        ys = array('d', (c[1] for c in coordinates))
+
+        # Contagem do grau de saída de cada nó (ida em u, volta em v)
+        degree = [0] * n
+        for u, v, oneway, _, _, _ in roads:
+            degree[index[u]] += 1
+            if not (sentido_unico and oneway):
+                degree[index[v]] += 1
+
+        offsets = array('i', [0]) * (n + 1)
+        for i in range(n):
+            offsets[i + 1] = offsets[i] + degree[i]
+
+        m = offsets[n]
+        targets = array('i', [0]) * m
+        lengths = array('d', [0.0]) * m
+        arc_road = array('i', [0]) * m
+        arc_reverse = array('b', [0]) * m
+
+        road_oneway = array('b', [0]) * len(roads)
+        road_name = array('i', [0]) * len(roads)
+        names = []
+        name_index = {}
+        geometries = []  # WKT de cada estrada, empacotado no fim
+
+        # Preenche as arestas mantendo, por nó, a ordem em que foram adicionadas
+        pos = list(offsets[:n])
+        for r, (u, v, oneway, length, geometry, name) in enumerate(roads):
+            iu, iv = index[u], index[v]
+            a = pos[iu]
+            pos[iu] += 1
+            targets[a], lengths[a], arc_road[a] = iv, length, r
+            if not (sentido_unico and oneway):
+                a = pos[iv]
+                pos[iv] += 1
+                targets[a], lengths[a], arc_road[a], arc_reverse[a] = iu, length, r, 1
+
+            road_oneway[r] = 1 if oneway else 0
+            if name not in name_index:
+                name_index[name] = len(names)
+                names.append(name)
+            road_name[r] = name_index[name]
+            geometries.append(geometry)
+
+        return CSRGraph(ids, xs, ys, offsets, targets, lengths, arc_road, arc_reverse,
+                        road_oneway, road_name, names, PackedGeometries.pack(geometries), sentido_unico)
+
+    # Secções do formato binário; extra acrescenta outras secções (ignoradas por from_buffer)
+    def to_bytes(self, extra=()):
+        return pack_sections(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.sections() + list(extra))
+
+    def sections(self):
+        geometries = self.geometries
+        return [
+            (b'ids', '\0'.join(self.ids).encode('utf-8')),
+            (b'xs', self.xs), (b'ys', self.ys),
+            (b'offsets', self.offsets), (b'targets', self.targets), (b'lengths', self.lengths),
+            (b'arcroad', self.arc_road), (b'arcrev', self.arc_reverse),
+            (b'oneway', self.road_oneway), (b'roadname', self.road_name),
+            (b'names', '\0'.join(self.names).encode('utf-8')),
+            (b'geomoff', geometries.offsets), (b'geomxy', geometries.coords),
+            (b'oneway1', array('b', [1 if self.sentido_unico else 0])),
+        ]
+
+    @staticmethod
+    def from_buffer(buffer):
+        # Os arrays numéricos são vistas sobre o buffer (ex.: um mmap), sem cópia
+        sections = unpack_sections(buffer, SNAPSHOT_MAGIC, SNAPSHOT_VERSION)
+
+        def strings(name):
+            return bytes(sections[name]).decode('utf-8').split('\0')
+
+        return CSRGraph(sections[b'ids'], sections[b'xs'].cast('d'), sections[b'ys'].cast('d'),
+                        sections[b'offsets'].cast('i'), sections[b'targets'].cast('i'),
+                        sections[b'lengths'].cast('d'), sections[b'arcroad'].cast('i'),
+                        sections[b'arcrev'].cast('b'), sections[b'oneway'].cast('b'),
+                        sections[b'roadname'].cast('i'), strings(b'names'),
+                        PackedGeometries(sections[b'geomoff'].cast('i'), sections[b'geomxy'].cast('d')),
+                        bool(sections[b'oneway1'].cast('b')[0]))
+
+    # Para enviar para outros processos: o grafo é serializado no formato dos snapshots
+    def __reduce__(self):
+        return CSRGraph.from_buffer, (self.to_bytes(),)
+
+    def roads(self):
+        # Devolve as estradas no formato aceite por build (usado para voltar a editar o grafo)
+        roads = []
+        for u in range(self.num_nodes):
+            for a in range(self.offsets[u], self.offsets[u + 1]):
+                if not self.arc_reverse[a]:
+                    r = self.arc_road[a]
+                    roads.append((r, self.ids[u], self.ids[self.targets[a]], bool(self.road_oneway[r]),
+                                  self.lengths[a], self.geometries[r], self.names[self.road_name[r]]))
+        roads.sort(key=lambda road: road[0])
+        return [road[1:] for road in roads]
+
+    # Adjacência inversa: as arestas que chegam a v são rev_sources/rev_arcs[rev_offsets[v]:rev_offsets[v + 1]]
+    def reverse(self):
+        if self._reverse is None:
+            n, m = self.num_nodes, self.num_arcs
+            rev_offsets = array('i', [0]) * (n + 1)
+            for a in range(m):
+                rev_offsets[self.targets[a] + 1] += 1
+            for v in range(n):
+                rev_offsets[v + 1] += rev_offsets[v]
+            rev_sources = array('i', [0]) * m
+            rev_arcs = array('i', [0]) * m
+            pos = list(rev_offsets[:n])
+            for u in range(n):
+                for a in range(self.offsets[u], self.offsets[u + 1]):
+                    v = self.targets[a]
+                    rev_sources[pos[v]] = u
+                    rev_arcs[pos[v]] = a
+                    pos[v] += 1
+            self._reverse = (rev_offsets, rev_sources, rev_arcs)
+        return self._reverse
+
+    # Distâncias mínimas da origem a todos os nós (ou de todos os nós até à origem, com reverse=True).
+    # frontier é a classe da fila de prioridade (ver Frontier.py)
+    def dijkstra(self, source, costs, reverse=False, frontier=BinaryHeap):
+        base, deltas = costs.base, costs.deltas
+        if reverse:
+            offsets, neighbors, arcs = self.reverse()
+        else:
+            offsets, neighbors, arcs = self.offsets, self.targets, range(self.num_arcs)
+        dist = [INF] * self.num_nodes
+        dist[source] = 0
+        heap = frontier()
+        push, pop = heap.push, heap.pop
+        push((0, source))
+        while heap:
+            d, u = pop()
+            if d > dist[u]:
+                continue
+            for k in range(offsets[u], offsets[u + 1]):
+                a = arcs[k]
+                nd = d + (deltas[a] if a in deltas else base[a])
+                v = neighbors[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    push((nd, v))
+        return dist
+
+    # Dijkstra de uma origem que pára quando todos os destinos estão fixados. Devolve os dicionários
+    # dist e parent (só com os nós visitados); destinos inalcançáveis ficam fora de dist.
+    def dijkstra_targets(self, source, targets, costs, frontier=BinaryHeap):
+        offsets, neighbors = self.offsets, self.targets
+        base, deltas = costs.base, costs.deltas
+        pending = set(targets)
+        dist = {source: 0}
+        parent = {source: -1}
+        settled = set()
+        heap = frontier()
+        push, pop = heap.push, heap.pop
+        push((0, source))
+        while heap and pending:
+            d, u = pop()
+            if u in settled:
+                continue
+            settled.add(u)
+            pending.discard(u)
+            for a in range(offsets[u], offsets[u + 1]):
+                nd = d + (deltas[a] if a in deltas else base[a])
+                v = neighbors[a]
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    parent[v] = u
+                    push((nd, v))
+        # Nós alcançados mas não fixados podem ter distâncias provisórias
+        return {v: dist[v] for v in settled}, parent
+
+    def find_arc(self, u, v):
+        # Primeira aresta u -> v (índices), ou -1
+        targets = self.targets
+        for a in range(self.offsets[u], self.offsets[u + 1]):
+            if targets[a] == v:
+                return a
+        return -1
+
+    def path_cost(self, path, costs):
+        # Soma dos custos (CostOverlay) ao longo de um caminho, usando a primeira aresta entre cada par de nós
+        custo = 0
+        for i in range(len(path) - 1):
+            a = self.find_arc(path[i], path[i + 1])
+            if a != -1:
+                custo += costs[a]
+        return custo
+
+    ########################################################################################################################
+    # Algoritmos de procura sobre índices. Todos devolvem (caminho, custo, espaço, nós expandidos).
+    # Os custos são lidos de um CostOverlay (vetor base partilhado + alterações esparsas).
+    # Arestas com custo infinito (estradas cortadas) são ignoradas.
+    ########################################################################################################################
+
+    def bfs(self, start, end, costs):
+        offsets, targets = self.offsets, self.targets
+        base, deltas = costs.base, costs.deltas
+        visited = {start}
+        fila = deque([start])
+        parent = {start: None}
+        max_space = 1
+        expanded = 0
+
+        while fila:
+            max_space = max(max_space, len(fila) + len(visited) + len(parent))
+
+            nodo_atual = fila.popleft()
+            expanded += 1
+            if nodo_atual == end:
+                break
+
+            for a in range(offsets[nodo_atual], offsets[nodo_atual + 1]):
+                if (deltas[a] if a in deltas else base[a]) == INF:
+                    continue
+                adjacente = targets[a]
+                if adjacente not in visited:
+                    if adjacente == end:
+                        parent[adjacente] = nodo_atual
+                        fila.clear()  # Esvazia a fila para terminar o loop
+                        break
+                    fila.append(adjacente)
+                    parent[adjacente] = nodo_atual
+                    visited.add(adjacente)
+
+        return self._path_from_parents(parent, end, costs) + (max_space, expanded)
+
+    def dfs(self, start, end, costs):
+        offsets, targets = self.offsets, self.targets
+        base, deltas = costs.base, costs.deltas
+        visited = set()
+        stack = [start]
+        parent = {start: None}
+        max_space = 1
+        expanded = 0
+
+        while stack:
+            max_space = max(max_space, len(stack) + len(visited) + len(parent))
+
+            current = stack.pop()
+            if current == end:
+                break
+
+            if current not in visited:
+                visited.add(current)
+                expanded += 1
+                for a in range(offsets[current], offsets[current + 1]):
+                    if (deltas[a] if a in deltas else base[a]) == INF:
+                        continue
+                    v = targets[a]
+                    if v not in visited:
+                        stack.append(v)
+                        parent[v] = current
+
+        return self._path_from_parents(parent, end, costs) + (max_space, expanded)
+
+    def _path_from_parents(self, parent, end, costs):
+        if end not in parent:
+            return [], 0
+        path = []
+        while end is not None:
+            path.append(end)
+            end = parent[end]
+        path.reverse()
+        return path, self.path_cost(path, costs)
+
+    # Vetores das procuras informadas, reutilizados entre consultas
+    def workspace(self):
+        if self._workspace is None:
+            self._workspace = SearchWorkspace(self.num_nodes)
+        return self._workspace
+
+    def greedy(self, start, end, costs, h):
+        offsets, targets = self.offsets, self.targets
+        base, deltas = costs.base, costs.deltas
+        n = self.num_nodes
+        ws = self.workspace()
+        gen = ws.reset()
+        stamp, in_open, g_score, parent = ws.stamp, ws.open_stamp, ws.g, ws.parent
+        stamp[start], g_score[start], parent[start] = gen, 0, -1
+        in_open[start] = gen
+        open_set = [(0, start)]
+        reached = 0  # nós com pai definido
+        max_space = 0
+        expanded = 0
+
+        while open_set:
+            max_space = max(max_space, len(open_set) + reached + n)
+            current = heapq.heappop(open_set)[1]
+            in_open[current] = 0
+            expanded += 1
+
+            if current == end:
+                return ws.path_to(end), g_score[end], max_space, expanded
+
+            g = g_score[current]
+            for a in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[a]
+                tentative_g_score = g + (deltas[a] if a in deltas else base[a])
+                seen = stamp[neighbor] == gen
+                if tentative_g_score < (g_score[neighbor] if seen else INF):
+                    if not seen:
+                        stamp[neighbor] = gen
+                        reached += 1
+                    parent[neighbor] = current
+                    g_score[neighbor] = tentative_g_score
+                    if in_open[neighbor] != gen:
+                        in_open[neighbor] = gen
+                        heapq.heappush(open_set, (h(neighbor), neighbor))
+        return [], 0, max_space, expanded
+
+    def a_star(self, start, end, costs, h, frontier=BinaryHeap):
+        # Sempre que um nó melhora é reinserido na fila; as entradas desatualizadas são ignoradas.
+        # Com uma RadixHeap a heurística tem de ser consistente (f nunca diminui ao longo de um caminho)
+        offsets, targets = self.offsets, self.targets
+        base, deltas = costs.base, costs.deltas
+        n = self.num_nodes
+        ws = self.workspace()
+        gen = ws.reset()
+        stamp, g_score, f_score, parent = ws.stamp, ws.g, ws.f, ws.parent
+        stamp[start], g_score[start], f_score[start], parent[start] = gen, 0, h(start), -1
+        open_set = frontier()
+        push, pop = open_set.push, open_set.pop
+        push((0, start))
+        reached = 0  # nós com pai definido
+        max_space = 0
+        expanded = 0
+
+        while open_set:
+            max_space = max(max_space, len(open_set) + reached + 2 * n)
+            f, current = pop()
+            if f > f_score[current]:
+                continue
+            expanded += 1
+
+            if current == end:
+                return ws.path_to(end), g_score[end], max_space, expanded
+
+            g = g_score[current]
+            for a in range(offsets[current], offsets[current + 1]):
+                neighbor = targets[a]
+                tentative_g_score = g + (deltas[a] if a in deltas else base[a])
+                seen = stamp[neighbor] == gen
+                if tentative_g_score < (g_score[neighbor] if seen else INF):
+                    f = tentative_g_score + h(neighbor)
+                    if f == INF:
+                        continue  # Estrada cortada ou nó que não chega ao destino
+                    if not seen:
+                        stamp[neighbor] = gen
+                        reached += 1
+                    parent[neighbor] = current
+                    g_score[neighbor] = tentative_g_score
+                    f_score[neighbor] = f
+                    push((f, neighbor))
+
+        return [], 0, max_space, expanded
+
+    # Procura bidirecional: uma procura a partir da origem pelas arestas de saída e outra a partir do
+    # destino pela adjacência inversa. Com um potencial p (A* bidirecional), as chaves são g + p(v) à
+    # frente e g - p(v) atrás, com p(v) = (h_destino(v) - h_origem(v)) / 2, que é consistente nos dois
+    # sentidos. Pára quando a soma dos mínimos das duas filas atinge o melhor caminho encontrado.
+    def bidirectional(self, start, end, costs, potential=None):
+        base, deltas = costs.base, costs.deltas
+        rev_offsets, rev_sources, rev_arcs = self.reverse()
+        p = potential if potential is not None else (lambda v: 0)
+        g_f, g_b = {start: 0}, {end: 0}
+        parent_f, parent_b = {start: -1}, {end: -1}
+        heap_f, heap_b = [(p(start), start)], [(-p(end), end)]
+        settled_f, settled_b = set(), set()
+        best, meet = (0, start) if start == end else (INF, -1)
+        max_space = 2
+        expanded = 0
+
+        while heap_f and heap_b and heap_f[0][0] + heap_b[0][0] < best:
+            max_space = max(max_space, len(heap_f) + len(heap_b) + len(g_f) + len(g_b))
+            if heap_f[0][0] <= heap_b[0][0]:
+                u = heapq.heappop(heap_f)[1]
+                if u in settled_f:
+                    continue
+                settled_f.add(u)
+                expanded += 1
+                g = g_f[u]
+                for a in range(self.offsets[u], self.offsets[u + 1]):
+                    c = deltas[a] if a in deltas else base[a]
+                    if c == INF:
+                        continue
+                    w = self.targets[a]
+                    ng = g + c
+                    if ng < g_f.get(w, INF):
+                        g_f[w] = ng
+                        parent_f[w] = u
+                        heapq.heappush(heap_f, (ng + p(w), w))
+                        if w in g_b and ng + g_b[w] < best:
+                            best, meet = ng + g_b[w], w
+            else:
+                u = heapq.heappop(heap_b)[1]
+                if u in settled_b:
+                    continue
+                settled_b.add(u)
+                expanded += 1
+                g = g_b[u]
+                for k in range(rev_offsets[u], rev_offsets[u + 1]):
+                    a = rev_arcs[k]
+                    c = deltas[a] if a in deltas else base[a]
+                    if c == INF:
+                        continue
+                    w = rev_sources[k]
+                    ng = g + c
+                    if ng < g_b.get(w, INF):
+                        g_b[w] = ng
+                        parent_b[w] = u
+                        heapq.heappush(heap_b, (ng - p(w), w))
+                        if w in g_f and ng + g_f[w] < best:
+                            best, meet = ng + g_f[w], w
+
+        if meet == -1:
+            return [], 0, max_space, expanded
+
+        path = []
+        u = meet
+        while u != -1:
+            path.append(u)
+            u = parent_f[u]
+        path.reverse()
+        u = parent_b[meet]
+        while u != -1:
+            path.append(u)
+            u = parent_b[u]
+        return path, best, max_space, expanded
@@ -0,0 +1,257 @@
+import heapq
+import mmap
+from array import array
+
+from CSRGraph import INF, pack_sections, unpack_sections
+
+CH_MAGIC = b'IACH\0\0\0\0'
+CH_VERSION = 1
+
+# Número máximo de nós fixados em cada procura de testemunhas durante a contração
+WITNESS_LIMIT = 100
+
+
+# Contraction Hierarchies: os nós são contraídos por ordem de importância e são criados atalhos
+# que preservam as distâncias. Uma consulta é uma procura bidirecional que só sobe na hierarquia.
+# O grafo "up" guarda, para cada nó v, as arestas v -> w com rank[w] > rank[v]; o grafo "down"
+# guarda as arestas u -> v com rank[u] > rank[v], indexadas por v (percorridas do destino para trás).
+# mids[a] é o nó contraído que deu origem ao atalho a, ou -1 para arestas originais.
+class ContractionHierarchy:
+    def __init__(self, num_arcs, rank, up_offsets, up_targets, up_weights, up_mids,
+                 down_offsets, down_targets, down_weights, down_mids):
+        self.num_arcs = num_arcs  # número de arestas do grafo original (para validar ficheiros)
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_weights = up_weights
+        self.up_mids = up_mids
+        self.down_offsets = down_offsets
+        self.down_targets = down_targets
+        self.down_weights = down_weights
+        self.down_mids = down_mids
+
+    @property
+    def num_nodes(self):
+        return len(self.rank)
+
+    ########################################################################################################################
+    # Pré-processamento
+    ########################################################################################################################
+
+    @staticmethod
+    def build(csr, costs):
+        n = csr.num_nodes
+        out_adj = [{} for _ in range(n)]  # u -> {w: (peso, mid)}
+        in_adj = [{} for _ in range(n)]  # w -> {u: (peso, mid)}
+        for u in range(n):
+            for a in range(csr.offsets[u], csr.offsets[u + 1]):
+                w, c = csr.targets[a], costs[a]
+                if w == u or c == INF:
+                    continue
+                if w not in out_adj[u] or c < out_adj[u][w][0]:
+                    out_adj[u][w] = (c, -1)
+                    in_adj[w][u] = (c, -1)
+
+        deleted = [0] * n  # vizinhos já contraídos (favorece uma contração uniforme)
+
+        def witness_search(source, excluded, max_cost):
+            dist = {source: 0}
+            heap = [(0, source)]
+            settled = 0
+            while heap and settled < WITNESS_LIMIT:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > max_cost:
+                    break
+                settled += 1
+                for w, (c, _) in out_adj[u].items():
+                    if w == excluded:
+                        continue
+                    nd = d + c
+                    if nd < dist.get(w, INF):
+                        dist[w] = nd
+                        heapq.heappush(heap, (nd, w))
+            return dist
+
+        def shortcuts_for(v):
+            shortcuts = []
+            outs = out_adj[v]
+            if not outs:
+                return shortcuts
+            max_out = max(c for c, _ in outs.values())
+            for u, (cu, _) in in_adj[v].items():
+                dist = witness_search(u, v, cu + max_out)
+                for w, (cw, _) in outs.items():
+                    if w != u and dist.get(w, INF) > cu + cw:
+                        shortcuts.append((u, w, cu + cw))
+            return shortcuts
+
+        def priority(v):
+            return len(shortcuts_for(v)) - len(in_adj[v]) - len(out_adj[v]) + deleted[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = array('i', [0]) * n
+        up = [None] * n
+        down = [None] * n
+        order = 0
+
+        while heap:
+            _, v = heapq.heappop(heap)
+            # Atualização preguiçosa da prioridade
+            p = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+
+            for u, w, c in shortcuts_for(v):
+                if w not in out_adj[u] or c < out_adj[u][w][0]:
+                    out_adj[u][w] = (c, v)
+                    in_adj[w][u] = (c, v)
+
+            rank[v] = order
+            order += 1
+            up[v] = [(w, c, mid) for w, (c, mid) in out_adj[v].items()]
+            down[v] = [(u, c, mid) for u, (c, mid) in in_adj[v].items()]
+            for w in out_adj[v]:
+                del in_adj[w][v]
+                deleted[w] += 1
+            for u in in_adj[v]:
+                del out_adj[u][v]
+                deleted[u] += 1
+            out_adj[v] = {}
+            in_adj[v] = {}
+
+        up_arrays = ContractionHierarchy._to_csr(up)
+        down_arrays = ContractionHierarchy._to_csr(down)
+        return ContractionHierarchy(csr.num_arcs, rank, *up_arrays, *down_arrays)
+
+    @staticmethod
+    def _to_csr(adjacency):
+        offsets = array('i', [0])
+        targets, weights, mids = array('i'), array('d'), array('i')
+        for edges in adjacency:
+            for w, c, mid in edges:
+                targets.append(w)
+                weights.append(c)
+                mids.append(mid)
+            offsets.append(len(targets))
+        return offsets, targets, weights, mids
+
+    ########################################################################################################################
+    # Persistência
+    ########################################################################################################################
+
+    def save(self, path):
+        sections = [
+            (b'narcs', array('q', [self.num_arcs])), (b'rank', self.rank),
+            (b'upoff', self.up_offsets), (b'uptgt', self.up_targets),
+            (b'upw', self.up_weights), (b'upmid', self.up_mids),
+            (b'dnoff', self.down_offsets), (b'dntgt', self.down_targets),
+            (b'dnw', self.down_weights), (b'dnmid', self.down_mids),
+        ]
+        with open(path, 'wb') as f:
+            f.write(pack_sections(CH_MAGIC, CH_VERSION, sections))
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        s = unpack_sections(buffer, CH_MAGIC, CH_VERSION)
+        return ContractionHierarchy(s[b'narcs'].cast('q')[0], s[b'rank'].cast('i'),
+                                    s[b'upoff'].cast('i'), s[b'uptgt'].cast('i'),
+                                    s[b'upw'].cast('d'), s[b'upmid'].cast('i'),
+                                    s[b'dnoff'].cast('i'), s[b'dntgt'].cast('i'),
+                                    s[b'dnw'].cast('d'), s[b'dnmid'].cast('i'))
+
+    ########################################################################################################################
+    # Consulta
+    ########################################################################################################################
+
+    # Devolve (caminho, custo, espaço, nós expandidos), como as procuras do CSRGraph
+    def search(self, start, end):
+        up_offsets, up_targets, up_weights = self.up_offsets, self.up_targets, self.up_weights
+        down_offsets, down_targets, down_weights = self.down_offsets, self.down_targets, self.down_weights
+        dist_f, dist_b = {start: 0}, {end: 0}
+        parent_f, parent_b = {start: -1}, {end: -1}
+        heap_f, heap_b = [(0, start)], [(0, end)]
+        best, meet = INF, -1
+        max_space = 2
+        expanded = 0
+
+        # Cada sentido pára quando o menor valor da sua fila já não melhora o melhor caminho
+        while (heap_f and heap_f[0][0] < best) or (heap_b and heap_b[0][0] < best):
+            max_space = max(max_space, len(heap_f) + len(heap_b) + len(dist_f) + len(dist_b))
+            if not heap_b or heap_b[0][0] >= best:
+                forward = True
+            elif not heap_f or heap_f[0][0] >= best:
+                forward = False
+            else:
+                forward = heap_f[0][0] <= heap_b[0][0]
+
+            if forward:
+                heap, dist, parent, other = heap_f, dist_f, parent_f, dist_b
+                offsets, targets, weights = up_offsets, up_targets, up_weights
+            else:
+                heap, dist, parent, other = heap_b, dist_b, parent_b, dist_f
+                offsets, targets, weights = down_offsets, down_targets, down_weights
+
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            expanded += 1
+            if u in other and d + other[u] < best:
+                best, meet = d + other[u], u
+
+            for a in range(offsets[u], offsets[u + 1]):
+                w = targets[a]
+                nd = d + weights[a]
+                if nd < dist.get(w, INF):
+                    dist[w] = nd
+                    parent[w] = u
+                    heapq.heappush(heap, (nd, w))
+
+        if meet == -1:
+            return [], 0, max_space, expanded
+
+        # Caminho na hierarquia: início -> nó de encontro -> destino
+        path = []
+        u = meet
+        while u != -1:
+            path.append(u)
+            u = parent_f[u]
+        path.reverse()
+        u = parent_b[meet]
+        while u != -1:
+            path.append(u)
+            u = parent_b[u]
+        return self.unpack(path), best, max_space, expanded
+
+    # Substitui os atalhos pelos nós do grafo original
+    def unpack(self, path):
+        if len(path) < 2:
+            return list(path)
+        result = [path[0]]
+        stack = [(path[i], path[i + 1]) for i in range(len(path) - 2, -1, -1)]
+        while stack:
+            u, w = stack.pop()
+            mid = self._mid(u, w)
+            if mid == -1:
+                result.append(w)
+            else:
+                stack.append((mid, w))
+                stack.append((u, mid))
+        return result
+
+    def _mid(self, u, w):
+        # A aresta u -> w está guardada no nó de menor rank
+        if self.rank[u] < self.rank[w]:
+            for a in range(self.up_offsets[u], self.up_offsets[u + 1]):
+                if self.up_targets[a] == w:
+                    return self.up_mids[a]
+        else:
+            for a in range(self.down_offsets[w], self.down_offsets[w + 1]):
+                if self.down_targets[a] == u:
+                    return self.down_mids[a]
+        raise KeyError((u, w))
@@ -0,0 +1,44 @@
+import itertools
+from array import array
+
+# Contador global de versões das alterações pontuais
+_versoes = itertools.count(1)
+
+
+# Custos das arestas de um grafo: um vetor base partilhado (nunca alterado, ex.: os
+# comprimentos do CSR ou um cenário de trânsito) mais um dicionário esparso com as
+# arestas alteradas (estradas cortadas, trânsito adicionado à mão).
+# O par (vetor base, versao) identifica o estado dos custos: cada escrita cria uma versão nova
+# e as cópias mantêm a versão enquanto não forem alteradas.
+class CostOverlay:
+    def __init__(self, base, deltas=None, versao=None):
+        self.base = base
+        self.deltas = {} if deltas is None else deltas
+        if versao is None:
+            versao = next(_versoes) if self.deltas else 0
+        self.versao = versao
+
+    def __getitem__(self, arc):
+        deltas = self.deltas
+        return deltas[arc] if arc in deltas else self.base[arc]
+
+    def __setitem__(self, arc, value):
+        self.deltas[arc] = value
+        self.versao = next(_versoes)
+
+    def __len__(self):
+        return len(self.base)
+
+    # Cópia em O(arestas alteradas): o vetor base continua partilhado
+    def copy(self):
+        return CostOverlay(self.base, dict(self.deltas), self.versao)
+
+    # Troca o vetor base (ex.: novo cenário de trânsito) mantendo as alterações pontuais
+    def with_base(self, base):
+        return CostOverlay(base, dict(self.deltas), self.versao)
+
+    # Para enviar para outros processos o vetor base é copiado para um array
+    def __reduce__(self):
+        base = array('d')
+        base.frombytes(memoryview(self.base).cast('B'))
+        return CostOverlay, (base, self.deltas, self.versao)
@@ -11,6 +11,10 @@ class Courier:
         self.score = score
         self.is_available = True
         self.deliveries = []
+        # Rota atual (entregas pela ordem de atribuição), mantida a cada atribuição: último nó e distância
+        # total em linha reta (km) desde current_node
+        self.last_node = current_node
+        self.route_distance = 0.0
 
     def can_accept_delivery(self, delivery):
         return self.current_load + delivery.weight <= self.max_weight and self.is_available
@@ -19,6 +23,8 @@ class Courier:
         if self.can_accept_delivery(delivery):
             self.current_load += delivery.weight
             self.deliveries.append(delivery)
+            self.route_distance += self.leg_distance(self.last_node, delivery.destination_node)
+            self.last_node = delivery.destination_node
             delivery.assigned_to = self.courier_id
             self.update_speed()  # Atualiza a velocidade após adicionar o peso da entrega
             return True
@@ -40,18 +46,22 @@ class Courier:
         else:
             self.score = 0
 
+    # Distância em linha reta (km) de um troço da rota
+    def leg_distance(self, u, v):
+        return self.graph.heuristic(u, v)
+
+    # Recalcula a rota a partir da lista de entregas (ex.: depois de a reordenar)
+    def recalculate_route(self):
+        stops = [self.current_node] + [delivery.destination_node for delivery in self.deliveries]
+        self.route_distance = sum(self.leg_distance(u, v) for u, v in zip(stops, stops[1:]))
+        self.last_node = stops[-1]
+
     def calculate_delivery_time_and_ecological_impact(self, new_delivery):
-        total_distance = 0
-        current_node = self.current_node
         total_load = self.current_load + new_delivery.weight
 
-        # Calcula a distância total percorrida para as entregas já atribuídas
-        for delivery in self.deliveries:
-            total_distance += self.graph.heuristic(current_node, delivery.destination_node)
-            current_node = delivery.destination_node
-
-        # Inclui a distância para a nova entrega
-        total_distance += self.graph.heuristic(current_node, new_delivery.destination_node)
+        # Distância total percorrida para as entregas já atribuídas (mantida em route_distance)
+        # e para a nova entrega
+        total_distance = self.route_distance + self.leg_distance(self.last_node, new_delivery.destination_node)
 
         # Calcula o tempo total de entrega
         effective_speed = self.calculate_effective_speed(total_load)
@@ -1,45 +1,186 @@
+import heapq
+
+import numpy as np
 import plotly.graph_objects as go
 from Graph import Graph
+from RouteOptimizer import RouteOptimizer
+from assignment import matriz_custos, atribuir_otimo, custo_atribuicao
+
+
+def _alteracao(metodo):
+    def alterar(self, *args, **kwargs):
+        self.versao += 1
+        return metodo(self, *args, **kwargs)
+    return alterar
+
+
+# Lista que conta as alterações feitas (versao), para o DeliveryService saber quando os índices das
+# listas couriers e deliveries ficaram desatualizados, mesmo que o tamanho não mude
+class ListaVersionada(list):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.versao = 0
+
+    append = _alteracao(list.append)
+    extend = _alteracao(list.extend)
+    insert = _alteracao(list.insert)
+    remove = _alteracao(list.remove)
+    pop = _alteracao(list.pop)
+    clear = _alteracao(list.clear)
+    sort = _alteracao(list.sort)
+    reverse = _alteracao(list.reverse)
+    __setitem__ = _alteracao(list.__setitem__)
+    __delitem__ = _alteracao(list.__delitem__)
+    __iadd__ = _alteracao(list.__iadd__)
+    __imul__ = _alteracao(list.__imul__)
+
+    # As cópias (copy.deepcopy, pickle) mantêm a versão
+    def __reduce__(self):
+        return ListaVersionada, (list(self),), self.__dict__
+
 
 class DeliveryService:
+    # Procuras opcionais que podem ser ativadas em graph.procuras_extra
+    PROCURAS_EXTRA = {"CH": "ch_search",
+                      "Bi-Dijkstra": "bidirectional_dijkstra",
+                      "Bi-A*": "bidirectional_a_star"}
+
 
     def __init__(self, graph):
         self.couriers = []
         self.deliveries = []
         self.graph = graph
+        self._aviso_ch = False  # o aviso de que a CH não foi incluída já foi mostrado
+        # Índices pelo ID das listas couriers e deliveries, com a versão das listas a que correspondem.
+        # Se as listas forem substituídas ou alteradas diretamente (ex.: deliveries.append ou
+        # deliveries[i] = outra), os índices são reconstruídos na utilização seguinte
+        self._estafetas = {}
+        self._entregas = {}
+        self._versao_estafetas = self.couriers.versao
+        self._versao_entregas = self.deliveries.versao
+        # Entregas pendentes por prazo: heap de (prazo, seq, entrega). As entradas são validadas ao sair
+        # (a entrega pode ter sido substituída ou mudado de estado); seq desempata pela ordem de inserção
+        self._pendentes = []
+        self._seq = {}  # seq atual de cada entrega
+        self._proximo_seq = 0
+        self._ordenadas = True  # deliveries já está ordenada por prazo (ou vazia)
+
+    # As listas atribuídas a couriers e deliveries são copiadas para uma ListaVersionada
+    @property
+    def couriers(self):
+        return self._couriers
+
+    @couriers.setter
+    def couriers(self, couriers):
+        self._couriers = couriers if isinstance(couriers, ListaVersionada) else ListaVersionada(couriers)
+        self._versao_estafetas = None
+
+    @property
+    def deliveries(self):
+        return self._deliveries
+
+    @deliveries.setter
+    def deliveries(self, deliveries):
+        self._deliveries = deliveries if isinstance(deliveries, ListaVersionada) else ListaVersionada(deliveries)
+        self._versao_entregas = None
+
+    def _sincronizar(self):
+        if self.couriers.versao != self._versao_estafetas:
+            self._estafetas = {courier.courier_id: courier for courier in self.couriers}
+            self._versao_estafetas = self.couriers.versao
+        if self.deliveries.versao != self._versao_entregas:
+            self._entregas, self._pendentes, self._seq = {}, [], {}
+            for delivery in self.deliveries:
+                self._entregas[delivery.delivery_id] = delivery
+                self._indexar(delivery)
+            self._versao_entregas = self.deliveries.versao
+            self._ordenadas = False
+
+    def _indexar(self, delivery):
+        seq = self._proximo_seq
+        self._proximo_seq += 1
+        self._seq[delivery.delivery_id] = seq
+        if delivery.status == 'Pendente':
+            heapq.heappush(self._pendentes, (delivery.deadline, seq, delivery))
+
+    def get_courier(self, courier_id):
+        self._sincronizar()
+        return self._estafetas.get(courier_id)
+
+    def get_delivery(self, delivery_id):
+        self._sincronizar()
+        return self._entregas.get(delivery_id)
 
     def add_courier(self, courier):
+        if courier is None:
+            return
+        self._sincronizar()
         # Verifica se o estafeta já existe na lista
-        for i, existing_courier in enumerate(self.couriers):
-            if existing_courier.courier_id == courier.courier_id:
-                # Remove o estafeta existente
-                self.couriers.pop(i)
-                break
+        existente = self._estafetas.get(courier.courier_id)
+        if existente is courier:
+            return  # o mesmo estafeta (ex.: ao voltar a atribuir as entregas) fica onde está
+        if existente is not None:
+            # Remove o estafeta existente
+            self.couriers.remove(existente)
         # Adiciona o novo estafeta
         self.couriers.append(courier)
+        self._estafetas[courier.courier_id] = courier
+        self._versao_estafetas = self.couriers.versao
 
     def add_delivery(self, delivery):
+        if delivery is None:
+            return
+        self._sincronizar()
         # Verifica se a encomenda já existe na lista
-        for i, existing_delivery in enumerate(self.deliveries):
-            if existing_delivery.delivery_id == delivery.delivery_id:
-                # Remove a encomenda existente
-                self.deliveries.pop(i)
-                break
+        existente = self._entregas.get(delivery.delivery_id)
+        if existente is delivery:
+            return  # a mesma encomenda fica onde está
+        if existente is not None:
+            # Remove a encomenda existente (a sua entrada no heap deixa de ser válida)
+            self.deliveries.remove(existente)
+        if self.deliveries and delivery.deadline < self.deliveries[-1].deadline:
+            self._ordenadas = False
         # Adiciona a nova encomenda
         self.deliveries.append(delivery)
+        self._entregas[delivery.delivery_id] = delivery
+        self._indexar(delivery)
+        self._versao_entregas = self.deliveries.versao
+
+    def _valida(self, seq, delivery):
+        return self._seq.get(delivery.delivery_id) == seq and delivery.status == 'Pendente'
+
+    # Entregas pendentes por ordem de prazo (e de inserção, em caso de empate)
+    def pending_deliveries(self):
+        self._sincronizar()
+        self._pendentes = [entrada for entrada in self._pendentes if self._valida(entrada[1], entrada[2])]
+        self._pendentes.sort()  # uma lista ordenada continua a ser um heap
+        return [delivery for _, _, delivery in self._pendentes]
+
+    # Ordena deliveries por prazo (ordenação estável), só se houve entregas adicionadas fora de ordem
+    def _ordenar_por_prazo(self):
+        if not self._ordenadas:
+            self.deliveries.sort(key=lambda d: d.deadline)
+            self._versao_entregas = self.deliveries.versao  # a ordem muda, mas os índices continuam válidos
+            self._ordenadas = True
 
     def allocate_deliveries_to_couriers(self):
-        self.deliveries.sort(key=lambda d: d.deadline)  # Ordenar entregas por prazo
-
-        for delivery in self.deliveries:
-            if delivery.status != 'Pendente':
-                continue  # Ignorar entregas que já foram atribuídas ou concluídas
+        self._sincronizar()
+        self._ordenar_por_prazo()
+        couriers = self.couriers
+        por_atribuir = []
+
+        # Entregas pendentes por ordem de prazo
+        while self._pendentes:
+            entrada = heapq.heappop(self._pendentes)
+            _, seq, delivery = entrada
+            if not self._valida(seq, delivery):
+                continue  # Ignorar entregas substituídas ou que já foram atribuídas ou concluídas
 
             best_courier = None
             best_score = float('inf')
             best_courier_score = -1
 
-            for courier in self.couriers:
+            for courier in couriers:
                 if courier.can_accept_delivery(delivery):
                     score = self.calculate_compatibility_score(courier, delivery)
                     if score < best_score or (score == best_score and courier.score > best_courier_score):
@@ -55,6 +196,40 @@ class DeliveryService:
                     estimated_time, ecological_impact = best_courier.calculate_delivery_time_and_ecological_impact(delivery)
                     print(f"Encomenda {delivery.delivery_id} atribuída a estafeta {best_courier.courier_id}. "
                           f"Tempo estimado de entrega: {estimated_time:.2f}h.")
+                    continue
+            por_atribuir.append(entrada)
+
+        # As que ficaram por atribuir voltam ao heap
+        for entrada in por_atribuir:
+            heapq.heappush(self._pendentes, entrada)
+
+    # Alternativa a allocate_deliveries_to_couriers: em vez de escolher, por ordem de prazo, o melhor estafeta
+    # para cada entrega, resolve de uma vez a atribuição de todas as entregas pendentes com o menor custo
+    # total (tempo de viagem pela rede e atrasos, ver assignment.py), respeitando a carga máxima de cada
+    # estafeta. custos é a matriz de matriz_custos (pela ordem de pending_deliveries), se já tiver sido
+    # calculada. Devolve o custo total (horas) e o número de entregas que ficaram por atribuir.
+    def allocate_deliveries_optimally(self, custos=None):
+        # As entregas são atribuídas por ordem de prazo, que é a ordem da rota de cada estafeta
+        pendentes = self.pending_deliveries()
+        couriers = self.couriers
+        if custos is None:
+            custos = matriz_custos(self.graph, couriers, pendentes)
+        pesos = np.array([delivery.weight for delivery in pendentes], dtype=float)
+        livres = np.array([courier.max_weight - courier.current_load if courier.is_available else 0
+                           for courier in couriers], dtype=float)
+        estafeta = atribuir_otimo(custos, pesos, livres)
+
+        for delivery, c in zip(pendentes, estafeta):
+            if c < 0:
+                continue
+            courier = couriers[c]
+            if courier.assign_delivery(delivery):
+                delivery.assign_to_courier(courier.courier_id)
+                delivery.update_status('Atribuída')
+                estimated_time, ecological_impact = courier.calculate_delivery_time_and_ecological_impact(delivery)
+                print(f"Encomenda {delivery.delivery_id} atribuída a estafeta {courier.courier_id}. "
+                      f"Tempo estimado de entrega: {estimated_time:.2f}h.")
+        return custo_atribuicao(custos, estafeta)
 
     def calculate_compatibility_score(self, courier, delivery):
         estimated_time, ecological_impact = courier.calculate_delivery_time_and_ecological_impact(delivery)
@@ -62,10 +237,46 @@ class DeliveryService:
         deadline_factor = max(1, (deadline - estimated_time) / deadline)
         return ecological_impact * 0.5 + deadline_factor * 0.5
 
-
+    # Reordena as entregas de cada estafeta antes do cálculo das rotas (ver RouteOptimizer), com o grafo
+    # de cada estafeta. Devolve o custo total (horas) das rotas antes e depois.
+    def optimize_delivery_order(self, tempo_limite=RouteOptimizer.TEMPO_LIMITE):
+        otimizador = RouteOptimizer(tempo_limite)
+        antes = depois = 0.0
+        for courier in self.couriers:
+            custo_inicial, custo_final = otimizador.otimizar(courier)
+            antes += custo_inicial
+            depois += custo_final
+        print(f"Ordem das entregas otimizada: custo total das rotas {antes:.2f}h -> {depois:.2f}h")
+        return antes, depois
+
+
+
+    # Algoritmos de procura a comparar no grafo de um estafeta. A CH só entra quando a hierarquia é
+    # partilhada (ver Graph.ch_disponivel)
+    def algoritmos(self, graph):
+        algoritmos = [("BFS", graph.procura_BFS),
+                      ("DFS", graph.procura_DFS),
+                      ("Greedy", graph.greedy_best_first_search),
+                      ("A*", graph.a_star_search)]
+        for nome in graph.procuras_extra:
+            if nome == "CH" and not graph.ch_disponivel():
+                if not self._aviso_ch:
+                    print("Aviso: CH não incluída nas rotas dos estafetas com trânsito sem seed "
+                          "(cada um teria de construir a sua hierarquia).")
+                    self._aviso_ch = True
+                continue
+            algoritmos.append((nome, getattr(graph, self.PROCURAS_EXTRA[nome])))
+        return algoritmos
 
     # Calcular os caminhos para cada estafeta para todos os algoritmos e ver qual é o melhor
-    def calculate_route_for_courier(self, courier):
+    def calculate_route_for_courier(self, courier, desenhar=True):
+        best_algorithm, best_total_path, resultados, paths = self.calcular_rotas(courier)
+        if desenhar:
+            self.draw_paths_on_graph(courier.graph, courier, paths, best_algorithm, best_total_path)
+        return best_algorithm, best_total_path, resultados
+
+    # Cálculo sem desenho; devolve também os caminhos de cada algoritmo (usado na simulação em paralelo)
+    def calcular_rotas(self, courier):
         print(f"\n{'=' * 200}")
         print(f"Calculando rotas para o estafeta {courier.courier_id} no ponto central de coleta")
         print(f"{'=' * 200}")
@@ -75,20 +286,13 @@ class DeliveryService:
         best_total_path = None
         paths = {}
         delivery_time_algorithm = {}
-        resultados = {
-            "BFS": {"custo": 0, "tempo": 0, "espaco": 0},
-            "DFS": {"custo": 0, "tempo": 0, "espaco": 0},
-            "Greedy": {"custo": 0, "tempo": 0, "espaco": 0},
-            "A*": {"custo": 0, "tempo": 0, "espaco": 0}
-        }
+        algoritmos = self.algoritmos(courier.graph)
+        resultados = {nome: {"custo": 0, "tempo": 0, "espaco": 0} for nome, _ in algoritmos}
 
         for delivery in courier.deliveries:
             delivery_time_algorithm[delivery.delivery_id] = {alg: float('inf') for alg in resultados}
 
-        for nome_algoritmo, funcao_procura in [("BFS", courier.graph.procura_BFS),
-                                               ("DFS", courier.graph.procura_DFS),
-                                               ("Greedy", courier.graph.greedy_best_first_search),
-                                               ("A*", courier.graph.a_star_search)]:
+        for nome_algoritmo, funcao_procura in algoritmos:
             print(f"\n{'-' * 20} Utilizando {nome_algoritmo} {'-' * 20}")
             current_node = courier.current_node
             custo_total = 0
@@ -141,18 +345,18 @@ class DeliveryService:
         print(f"Custo total: {best_cost}")
         print(f"{'-' * 50}")
 
-        self.draw_paths_on_graph(courier.graph, courier, paths, best_algorithm, best_total_path)
-        return best_algorithm, best_total_path, resultados
+        return best_algorithm, best_total_path, resultados, paths
 
-    # Funcao para avaliar as entregas
-    def evaluate_deliveries(self):
+    # Funcao para avaliar as entregas. avaliacoes, se indicado, substitui o input: uma função
+    # delivery -> avaliação ou um dicionário delivery_id -> avaliação (entregas em falta não são avaliadas)
+    def evaluate_deliveries(self, avaliacoes=None):
         for delivery in self.deliveries:
             if delivery.status == 'Concluída':
                 vehicle_type = 'Desconhecido'
                 id_courier = 'Desconhecido'
 
                 if delivery.assigned_to:
-                    courier = next((c for c in self.couriers if c.courier_id == delivery.assigned_to), None)
+                    courier = self.get_courier(delivery.assigned_to)
                     if courier:
                         vehicle_type = courier.transport_type
                         id_courier = courier.courier_id
@@ -166,7 +370,15 @@ class DeliveryService:
                     f"Prazo: {delivery.deadline}h, Tempo de Entrega: {tempo_entrega_str}, Estafeta: {id_courier}, Veículo: {vehicle_type}, Preço: {delivery.preco}")
 
                 try:
-                    rating = int(input("Digite sua avaliação (0-5): "))
+                    if avaliacoes is None:
+                        rating = int(input("Digite sua avaliação (0-5): "))
+                    elif callable(avaliacoes):
+                        rating = int(avaliacoes(delivery))
+                    elif delivery.delivery_id in avaliacoes:
+                        rating = int(avaliacoes[delivery.delivery_id])
+                    else:
+                        print("Sem avaliação para esta entrega.")
+                        continue
                     delivery.set_customer_rating(rating)
                     print(f"Avaliação recebida: {rating} estrelas.")
                 except ValueError:
@@ -177,34 +389,10 @@ class DeliveryService:
 ##########################################################################################################################################################
 
     def draw_paths_on_graph(self, graph, courier, paths, best_algorithm, best_path):
-        fig = go.Figure()
-
-        # Adicionando arestas do grafo
-        for node_id, edges in graph.edges.items():
-            for edge in edges:
-                line_coords = Graph.parse_linestring(edge.geometry)
-                if line_coords:
-                    x_coords, y_coords = zip(*line_coords)
-                else:
-                    start_node = graph.nodes[edge.u]
-                    end_node = graph.nodes[edge.v]
-                    x_coords = [start_node.coordinates[0], end_node.coordinates[0]]
-                    y_coords = [start_node.coordinates[1], end_node.coordinates[1]]
-
-                mid_pt = Graph.midpoint((x_coords[0], y_coords[0]), (x_coords[-1], y_coords[-1]))
-                fig.add_trace(
-                    go.Scatter(x=x_coords, y=y_coords, mode='lines', line=dict(color='grey'), showlegend=False))
-                fig.add_trace(
-                    go.Scatter(x=[mid_pt[0]], y=[mid_pt[1]], text=[f'{edge.name} ({edge.custo:.2f} m)'], mode='text',
-                               showlegend=False, textposition='bottom center', textfont=dict(size=8)))
-
-        for node_id, node in graph.nodes.items():
-            fig.add_trace(go.Scatter(
-                x=[node.coordinates[0]], y=[node.coordinates[1]],
-                mode='markers', marker=dict(color='blue', size=5),
-                name=f'{node_id}',
-                showlegend=False
-            ))
+        # Mapa base com as arestas e os nós do grafo (construído uma vez e reutilizado por todos os estafetas
+        # com o mesmo estado dos custos); os caminhos e marcadores são acrescentados a uma cópia
+        nivel = graph.nivel_para_largura()
+        fig = graph.mapa_base(tamanho_texto=8, nivel=nivel)
 
         pickup_node_coords = graph.nodes[courier.current_node].coordinates
         fig.add_trace(go.Scatter(x=[pickup_node_coords[0]], y=[pickup_node_coords[1]], mode='markers+text',
@@ -212,24 +400,19 @@ class DeliveryService:
                                  textposition='top center', textfont=dict(color='orange', size=15,family='Arial, bold'),name='Ponto de Recolha'))
 
         # Cores para os caminhos dos algoritmos
-        path_colors = {"BFS": "green", "DFS": "red", "Greedy": "purple", "A*": "blue", "Melhor Caminho": "yellow"}
+        path_colors = {"BFS": "green", "DFS": "red", "Greedy": "purple", "A*": "blue", "CH": "brown",
+                       "Bi-Dijkstra": "pink", "Bi-A*": "cyan", "Melhor Caminho": "yellow"}
         line_width = 3
 
         # Adicionando caminhos dos algoritmos
         def draw_paths(path, color, algorithm, custo, legendgroup):
-            for i in range(len(path) - 1):
-                u, v = path[i], path[i + 1]
-                for edge in graph.edges[u]:
-                    if edge.v == v:
-                        if edge.geometry:
-                            line_coords = Graph.parse_linestring(edge.geometry)
-                            x_coords, y_coords = zip(*line_coords)
-                        else:
-                            x_coords = [graph.nodes[u].coordinates[0], graph.nodes[v].coordinates[0]]
-                            y_coords = [graph.nodes[u].coordinates[1], graph.nodes[v].coordinates[1]]
-                        fig.add_trace(
-                            go.Scatter(x=x_coords, y=y_coords, mode='lines', line=dict(color=color, width=line_width),
-                                       legendgroup=legendgroup, showlegend=False))
+            # Todas as arestas do caminho num único traço
+            linhas = [graph.coordenadas_aresta(edge, nivel)
+                      for u, v in zip(path, path[1:]) for edge in graph.edges[u] if edge.v == v]
+            x_coords, y_coords = Graph.juntar_linhas(linhas)
+            fig.add_trace(
+                go.Scattergl(x=x_coords, y=y_coords, mode='lines', line=dict(color=color, width=line_width),
+                             legendgroup=legendgroup, hoverinfo='skip', showlegend=False))
 
             # Adiciona uma legenda no final do caminho
             last_node_coords = graph.nodes[path[-1]].coordinates
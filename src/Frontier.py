@@ -0,0 +1,132 @@
+import heapq
+from functools import partial
+
+# Escala usada pela RadixHeap para converter as chaves (metros) em inteiros (milímetros)
+ESCALA_RADIX = 1000
+
+
+# Filas de prioridade intercambiáveis para as procuras da família Dijkstra. Todas guardam pares
+# (chave, nó) e têm a mesma interface: push((chave, nó)), pop() -> (chave, nó) e len()/bool().
+# As procuras continuam a ignorar entradas desatualizadas, por isso qualquer fila serve.
+
+# Heap binária preguiçosa (heapq): cada melhoria insere uma entrada nova e as antigas ficam na fila
+class BinaryHeap(list):
+    def __init__(self):
+        super().__init__()
+        self.push = partial(heapq.heappush, self)
+        self.pop = partial(heapq.heappop, self)
+
+
+# Heap binária indexada com decrease-key: cada nó aparece no máximo uma vez na fila.
+# Inserir um nó que já está na fila só altera a chave se esta diminuir.
+class IndexedBinaryHeap:
+    def __init__(self):
+        self.heap = []
+        self.pos = {}  # nó -> posição em heap
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, item):
+        key, v = item
+        i = self.pos.get(v)
+        if i is None:
+            self.heap.append(item)
+            i = len(self.heap) - 1
+        elif key < self.heap[i][0]:
+            self.heap[i] = item
+        else:
+            return
+        self._sift_up(i)
+
+    def pop(self):
+        heap, pos = self.heap, self.pos
+        top = heap[0]
+        del pos[top[1]]
+        last = heap.pop()
+        if heap:
+            heap[0] = last
+            pos[last[1]] = 0
+            self._sift_down(0)
+        return top
+
+    def _sift_up(self, i):
+        heap, pos = self.heap, self.pos
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent][0] <= item[0]:
+                break
+            heap[i] = heap[parent]
+            pos[heap[i][1]] = i
+            i = parent
+        heap[i] = item
+        pos[item[1]] = i
+
+    def _sift_down(self, i):
+        heap, pos = self.heap, self.pos
+        n = len(heap)
+        item = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1][0] < heap[child][0]:
+                child += 1
+            if item[0] <= heap[child][0]:
+                break
+            heap[i] = heap[child]
+            pos[heap[i][1]] = i
+            i = child
+        heap[i] = item
+        pos[item[1]] = i
+
+
+# Radix heap para procuras monótonas (as chaves inseridas nunca são menores que a última retirada),
+# como o Dijkstra e o A* com heurística consistente. As chaves são convertidas em inteiros
+# (chave * escala) e colocadas no balde do bit mais significativo em que diferem da última
+# chave retirada. O balde 0 é uma heapq pela chave original, por isso a ordem de saída é exata.
+class RadixHeap:
+    def __init__(self, escala=ESCALA_RADIX):
+        self.escala = escala
+        self.last = 0
+        self.buckets = [[] for _ in range(65)]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, item):
+        k = int(item[0] * self.escala)
+        if k < self.last:
+            k = self.last  # arredondamentos de vírgula flutuante
+        b = (k ^ self.last).bit_length()
+        if b == 0:
+            heapq.heappush(self.buckets[0], item)
+        else:
+            self.buckets[b].append((k, item))
+        self.size += 1
+
+    def pop(self):
+        buckets = self.buckets
+        first = buckets[0]
+        if not first:
+            # Redistribui o primeiro balde não vazio a partir da sua menor chave
+            b = 1
+            while not buckets[b]:
+                b += 1
+            entries = buckets[b]
+            buckets[b] = []
+            last = self.last = min(k for k, _ in entries)
+            for k, item in entries:
+                nb = (k ^ last).bit_length()
+                if nb == 0:
+                    first.append(item)
+                else:
+                    buckets[nb].append((k, item))
+            heapq.heapify(first)
+        self.size -= 1
+        return heapq.heappop(first)
+
+
+FRONTEIRAS = {"binary": BinaryHeap, "indexed": IndexedBinaryHeap, "radix": RadixHeap}
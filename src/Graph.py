@@ -1,10 +1,36 @@
+import contextlib
 import math
-import heapq
-from queue import Queue
+import mmap
+import os
+import numpy as np
+from collections.abc import Mapping
 import plotly.graph_objects as go
 import re
 import time
-import random
+from array import array
+
+from CSRGraph import CSRGraph, INF, NIVEIS_DETALHE, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, unpack_sections
+from CostOverlay import CostOverlay
+from Traffic import TrafficModel
+from ContractionHierarchy import ContractionHierarchy
+from Frontier import FRONTEIRAS
+from Landmarks import LandmarkHeuristic
+from PathCache import PathCache
+from SpatialIndex import SpatialIndex
+from Node import Node
+
+# Raio médio da Terra em quilómetros
+RAIO_TERRA = 6371.0
+
+# Número de mapas base (e geometrias) guardados em cache para os desenhos
+CAPACIDADE_MAPAS = 16
+# Número de vetores das heurísticas (um por destino, com |V| valores) guardados em cache
+CAPACIDADE_HEURISTICAS = 32
+# Número de Contraction Hierarchies (uma por estado dos custos) guardadas em cache
+CAPACIDADE_HIERARQUIAS = 4
+
+# Largura aproximada, em pixels, das figuras do plotly (para escolher o nível de detalhe)
+LARGURA_FIGURA = 1200
 
 
 class Edge:
@@ -18,43 +44,294 @@ class Edge:
         self.name = name  # Nome da rua
 
 
+# Aresta criada a pedido a partir do CSR; o custo é lido e escrito no vetor de custos do grafo
+class ArcEdge:
+    __slots__ = ('_graph', 'arc', 'u', 'v')
+
+    def __init__(self, graph, arc, u, v):
+        self._graph = graph
+        self.arc = arc
+        self.u = u
+        self.v = v
+
+    @property
+    def oneway(self):
+        csr = self._graph.csr
+        return bool(csr.road_oneway[csr.arc_road[self.arc]])
+
+    @property
+    def length(self):
+        return self._graph.csr.lengths[self.arc]
+
+    @property
+    def geometry(self):
+        csr = self._graph.csr
+        return csr.geometries[csr.arc_road[self.arc]]
+
+    @property
+    def name(self):
+        csr = self._graph.csr
+        return csr.names[csr.road_name[csr.arc_road[self.arc]]]
+
+    @property
+    def custo(self):
+        return self._graph.custos[self.arc]
+
+    @custo.setter
+    def custo(self, value):
+        self._graph.custos[self.arc] = value
+
+
+# Vistas só de leitura com a mesma interface dos antigos dicionários graph.nodes e graph.edges
+class NodesView(Mapping):
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node_id):
+        csr = self._graph.csr
+        i = csr.index[node_id]
+        return Node(node_id, (csr.xs[i], csr.ys[i]))
+
+    def __contains__(self, node_id):
+        return node_id in self._graph.csr.index
+
+    def __iter__(self):
+        return iter(self._graph.csr.ids)
+
+    def __len__(self):
+        return self._graph.csr.num_nodes
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+class EdgesView(Mapping):
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node_id):
+        graph = self._graph
+        csr, custos = graph.csr, graph.custos
+        u = csr.index[node_id]
+        ids, targets = csr.ids, csr.targets
+        return [ArcEdge(graph, a, node_id, ids[targets[a]])
+                for a in range(csr.offsets[u], csr.offsets[u + 1]) if custos[a] != INF]
+
+    def __contains__(self, node_id):
+        return node_id in self._graph.csr.index
+
+    def __iter__(self):
+        return iter(self._graph.csr.ids)
+
+    def __len__(self):
+        return self._graph.csr.num_nodes
+
+
 class Graph:
-    def __init__(self):
-        self.nodes = {}
-        self.edges = {}
+    # Com sentido_unico, as estradas de sentido único só podem ser percorridas de u para v
+    def __init__(self, sentido_unico=False):
+        self.sentido_unico = sentido_unico
+        # Nós e estradas adicionados desde a última compactação
+        self._novos_nodes = {}
+        self._novas_estradas = []
+        self._csr = None
+        self._custos = None  # CostOverlay com o custo atual de cada aresta do CSR
+        self._transito = None  # TrafficModel partilhado pelos clones
+        self._hierarquias = PathCache(CAPACIDADE_HIERARQUIAS)  # Contraction Hierarchies por estado dos custos, partilhadas pelos clones
+        self.procuras_extra = []  # procuras incluídas nas rotas além das quatro base (ex.: "CH", "Bi-A*")
+        self.landmarks = None  # LandmarkHeuristic; quando definido substitui a heurística de Haversine
+        self.cache = PathCache()  # resultados das procuras, partilhados pelos clones
+        self._indice_espacial = None  # SpatialIndex dos nós, partilhado pelos clones
+        self._radianos = None  # coordenadas em radianos para a heurística, partilhadas pelos clones
+        self._fator = None  # (base, versao, fator) do fator mínimo dos landmarks para os custos atuais
+        self.mapas = PathCache(CAPACIDADE_MAPAS)  # mapas base dos desenhos, partilhados pelos clones
+        self.heuristicas = PathCache(CAPACIDADE_HEURISTICAS)  # vetores das heurísticas por destino, partilhados pelos clones
+        self.nos_expandidos = 0  # nós expandidos pela última procura
+
+    # Compacta os nós e estradas pendentes na representação CSR
+    def _compactar(self):
+        if self._novos_nodes or self._novas_estradas or self._csr is None:
+            nodes = self._novos_nodes
+            self._csr = CSRGraph.build(nodes.keys(), [node.coordinates for node in nodes.values()],
+                                       self._novas_estradas, self.sentido_unico)
+            self._custos = CostOverlay(self._csr.lengths)
+            self._transito = None
+            self._hierarquias = PathCache(CAPACIDADE_HIERARQUIAS)
+            self.landmarks = None
+            self.cache.clear()
+            self._indice_espacial = None
+            self._radianos = None
+            self.mapas.clear()
+            self.heuristicas.clear()
+            self._novos_nodes = {}
+            self._novas_estradas = []
+
+    # Volta a colocar o grafo em modo de construção (os custos voltam ao comprimento das estradas)
+    def _descompactar(self):
+        if self._csr is not None and not self._novos_nodes:
+            csr = self._csr
+            self._novos_nodes = {node_id: Node(node_id, (csr.xs[i], csr.ys[i])) for i, node_id in enumerate(csr.ids)}
+            self._novas_estradas = csr.roads()
+            self._csr = None
+            self._custos = None
+            self._transito = None
+            self._hierarquias = PathCache(CAPACIDADE_HIERARQUIAS)
+            self.landmarks = None
+            self.cache.clear()
+            self._indice_espacial = None
+            self._radianos = None
+            self.mapas.clear()
+            self.heuristicas.clear()
+
+    @property
+    def csr(self):
+        self._compactar()
+        return self._csr
+
+    @property
+    def custos(self):
+        self._compactar()
+        return self._custos
+
+    @property
+    def transito(self):
+        if self._transito is None:
+            self._transito = TrafficModel(self.csr.lengths)
+        return self._transito
+
+    # Construído uma vez por topologia, na primeira consulta
+    @property
+    def indice_espacial(self):
+        if self._indice_espacial is None:
+            csr = self.csr
+            self._indice_espacial = SpatialIndex(csr.ids, csr.xs, csr.ys)
+        return self._indice_espacial
+
+    @property
+    def nodes(self):
+        self._compactar()
+        return NodesView(self)
+
+    @property
+    def edges(self):
+        self._compactar()
+        return EdgesView(self)
 
     def add_node(self, node):
-        self.nodes[node.node_id] = node
-        if node.node_id not in self.edges:
-            self.edges[node.node_id] = []
+        self._descompactar()
+        self._novos_nodes[node.node_id] = node
 
     def add_edge(self, edge):
-        self.edges[edge.u].append(edge)
-        reverse_edge = Edge(edge.v, edge.u, edge.oneway,
-                            edge.length, edge.geometry, edge.name)
-        self.edges[edge.v].append(reverse_edge)
+        self._descompactar()
+        if edge.u not in self._novos_nodes:
+            raise KeyError(edge.u)
+        if edge.v not in self._novos_nodes:
+            raise KeyError(edge.v)
+        self._novas_estradas.append((edge.u, edge.v, edge.oneway, edge.length, edge.geometry, edge.name))
         """if not edge.oneway:
             # Se a rua não é de sentido único, adicionar a areta inversa
             reverse_edge = Edge(edge.v, edge.u, edge.oneway,
                                 edge.length, edge.geometry, edge.name)
             self.edges[edge.v].append(reverse_edge)"""
 
-    def clone(self):
-        new_graph = Graph()
-        new_graph.nodes = self.nodes.copy()
-        new_graph.edges = {}
-        for node_id, edges in self.edges.items():
-            new_graph.edges[node_id] = [Edge(edge.u, edge.v, edge.oneway, edge.length, edge.geometry, edge.name) for edge in edges]
+    @staticmethod
+    def _de_csr(csr):
+        graph = Graph(csr.sentido_unico)
+        graph._csr = csr
+        graph._custos = CostOverlay(csr.lengths)
+        return graph
+
+    # A topologia e o vetor de custos base são partilhados; só as alterações pontuais são copiadas.
+    # custos (CostOverlay) substitui os custos do clone, ex.: num processo de simulação
+    def clone(self, custos=None):
+        new_graph = Graph(self.sentido_unico)
+        new_graph._csr = self.csr
+        new_graph._custos = self.custos.copy() if custos is None else custos
+        new_graph._transito = self.transito
+        new_graph._hierarquias = self._hierarquias
+        new_graph.procuras_extra = list(self.procuras_extra)
+        new_graph.landmarks = self.landmarks
+        new_graph.cache = self.cache
+        new_graph._indice_espacial = self._indice_espacial
+        new_graph._radianos = self._radianos
+        new_graph.mapas = self.mapas
+        new_graph.heuristicas = self.heuristicas
         return new_graph
 
+    # Ao enviar o grafo para outro processo as caches não são copiadas; são reconstruídas a pedido
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        estado['_transito'] = None
+        estado['_hierarquias'] = PathCache(CAPACIDADE_HIERARQUIAS)
+        estado['cache'] = PathCache(self.cache.capacidade)
+        estado['_indice_espacial'] = None
+        estado['_radianos'] = None
+        estado['_fator'] = None
+        estado['mapas'] = PathCache(CAPACIDADE_MAPAS)
+        estado['heuristicas'] = PathCache(CAPACIDADE_HEURISTICAS)
+        return estado
+
+    # Guarda a topologia, coordenadas, comprimentos e geometrias num ficheiro binário versionado.
+    # Escreve num ficheiro temporário na mesma pasta e só depois o troca pelo snapshot, para que uma
+    # escrita interrompida nunca deixe um snapshot truncado
+    def save_snapshot(self, path):
+        temporario = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporario, 'wb') as f:
+                f.write(self.csr.to_bytes())
+            os.replace(temporario, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temporario)
+            raise
+
+    # Carrega um snapshot por mmap; os arrays do CSR ficam apontados para o ficheiro
+    @staticmethod
+    def load_snapshot(path):
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return Graph.from_buffer(buffer)
+
+    # Topologia, custos atuais (já com as alterações pontuais) e landmarks no formato dos snapshots,
+    # ex.: para publicar o grafo em memória partilhada (ver SharedGraph)
+    def to_bytes(self):
+        custos = self.custos
+        vetor = array('d')
+        vetor.frombytes(memoryview(custos.base).cast('B'))
+        for a, custo in custos.deltas.items():
+            vetor[a] = custo
+        extra = [(b'custos', vetor)]
+        if self.landmarks is not None:
+            extra += self.landmarks.sections()
+        return self.csr.to_bytes(extra)
+
+    # Grafo sobre um buffer no formato dos snapshots, sem copiar os arrays. As secções de custos e
+    # landmarks escritas por to_bytes são usadas quando existem.
+    @staticmethod
+    def from_buffer(buffer):
+        csr = CSRGraph.from_buffer(buffer)
+        graph = Graph._de_csr(csr)
+        sections = unpack_sections(buffer, SNAPSHOT_MAGIC, SNAPSHOT_VERSION)
+        if b'custos' in sections:
+            graph._custos = CostOverlay(sections[b'custos'].cast('d'))
+        if b'lmids' in sections:
+            graph.landmarks = LandmarkHeuristic.from_sections(sections, csr.num_nodes)
+        return graph
+
     def cortar_estrada(self):
         u = input("Insira o ID do nodo inicial da estrada a cortar: ")
         v = input("Insira o ID do nodo final da estrada a cortar: ")
 
-        if u in self.edges and v in self.edges:
-            # Remove a aresta u -> v
-            self.edges[u] = [edge for edge in self.edges[u] if edge.v != v]
-            self.edges[v] = [edge for edge in self.edges[v] if edge.u != u]
+        csr, custos = self.csr, self.custos
+        if u in csr.index and v in csr.index:
+            # Remove a aresta u -> v (custo infinito)
+            iu, iv = csr.index[u], csr.index[v]
+            for a in range(csr.offsets[iu], csr.offsets[iu + 1]):
+                if csr.targets[a] == iv:
+                    custos[a] = INF
             print(f"Estrada entre {u} e {v} cortada.")
         else:
             print("Estrada não encontrada.")
@@ -105,26 +382,56 @@ class Graph:
                 nome = nome or "Nome não disponível"
                 print(f"De {u} para {v}: {custo} metros, Rua: {nome}")
 
-    def heuristic(self, node1_id, node2_id):
-        node1 = self.nodes[node1_id]
-        node2 = self.nodes[node2_id]
-        lat1, lon1 = node1.coordinates
-        lat2, lon2 = node2.coordinates
+    # Coordenadas dos nós em radianos e cosseno da "latitude", calculados uma vez por topologia.
+    # Tal como na versão original da heurística, a primeira coordenada faz de latitude.
+    # Devolve os arrays NumPy e as mesmas colunas em listas (mais rápidas para acessos individuais).
+    @property
+    def radianos(self):
+        if self._radianos is None:
+            csr = self.csr
+            lat = np.radians(np.frombuffer(csr.xs, dtype=np.float64))
+            lon = np.radians(np.frombuffer(csr.ys, dtype=np.float64))
+            cos_lat = np.cos(lat)
+            self._radianos = (lat, lon, cos_lat), (lat.tolist(), lon.tolist(), cos_lat.tolist())
+        return self._radianos
 
-        # Conversão de graus para radianos
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    def heuristic(self, node1_id, node2_id):
+        csr = self.csr
+        return self._heuristica(csr.index[node1_id], csr.index[node2_id])
+
+    # Fórmula de Haversine para cálculo de distância em linha reta (km), sobre os índices dos nós
+    def _heuristica(self, i, j):
+        lat, lon, cos_lat = self.radianos[1]
+        a = math.sin((lat[j] - lat[i]) / 2) ** 2 + cos_lat[i] * cos_lat[j] * math.sin((lon[j] - lon[i]) / 2) ** 2
+        return 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)) * RAIO_TERRA
+
+    # Versão vetorizada: i e j são arrays de índices (ou um índice, que é repetido)
+    def _heuristica_many(self, i, j):
+        lat, lon, cos_lat = self.radianos[0]
+        a = np.sin((lat[j] - lat[i]) / 2) ** 2 + cos_lat[i] * cos_lat[j] * np.sin((lon[j] - lon[i]) / 2) ** 2
+        return 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)) * RAIO_TERRA
+
+    # Distâncias em linha reta (km) de cada nó da lista até target, numa única chamada. target pode ser
+    # um ID ou uma lista de IDs do mesmo tamanho (distância de nodes[k] a target[k])
+    def heuristic_many(self, nodes, target):
+        index = self.csr.index
+        i = np.array([index[node_id] for node_id in nodes], dtype=np.intp)
+        if isinstance(target, str):
+            j = index[target]
+        else:
+            j = np.array([index[node_id] for node_id in target], dtype=np.intp)
+        return self._heuristica_many(i, j)
 
-        # Fórmula de Haversine para cálculo de distância em linha reta
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    # Nós mais próximos de um ponto (longitude, latitude), ex.: para associar uma morada a um nó
+    def nearest_node(self, x, y):
+        return self.indice_espacial.nearest_node(x, y)
 
-        # Raio médio da Terra em quilômetros
-        R = 6371.0
-        distance = R * c
+    def k_nearest(self, x, y, k):
+        return self.indice_espacial.k_nearest(x, y, k)
 
-        return distance
+    # Raio em metros
+    def nodes_within(self, x, y, radius):
+        return self.indice_espacial.nodes_within(x, y, radius)
 
     # Ver arestas de um caminho
     def get_edges_along_path(self, path):
@@ -137,176 +444,195 @@ class Graph:
                     break
         return edges
 
-    def apply_traffic_conditions(self,transport):
-        # Aplicar condições de tráfego a todas as arestas
-
-        if transport != 'Bicicleta':
-            for node_id in self.edges:
-                for edge in self.edges[node_id]:
-                    traffic = random.choice(["Normal", "Congestionado", "Leve"])
-                    if traffic == "Congestionado":
-                        if transport == 'Carro':
-                            edge.custo = edge.length * 1.5
-                        if transport == 'Moto':
-                            edge.custo = edge.length * 1
-                    elif traffic == "Leve":
-                        if transport == 'Carro':
-                            edge.custo = edge.length * 0.8
-                        if transport == 'Moto':
-                            edge.custo = edge.length * 0.3
+    # Aplicar condições de tráfego a todas as arestas. O cenário (Normal/Congestionado/Leve por aresta)
+    # é gerado de uma vez pelo TrafficModel; a mesma seed produz sempre as mesmas condições.
+    def apply_traffic_conditions(self, transport, seed=None):
+        self._custos = self.custos.with_base(self.transito.custos(transport, seed))
 
     ############################################################################################################################################
     ###########################################         Algoritmos             #################################################################
     ############################################################################################################################################
 
-    def procura_BFS(self, start, end):
+    # Executa uma procura do CSR sobre índices e converte o resultado para IDs. heuristica(i, j),
+    # se indicada, devolve o argumento extra da procura (função heurística ou potencial).
+    # Os resultados ficam na cache, indexados pelo algoritmo, extremos, estado dos custos e landmarks;
+    # cortar estradas, adicionar trânsito ou mudar o cenário de trânsito muda o estado dos custos.
+    # fronteira escolhe a fila de prioridade das procuras que a aceitam ("binary", "indexed" ou "radix").
+    def _procurar(self, nome, procura, start, end, heuristica=None, fronteira=None):
         start_time = time.time()
-        visited = set()
-        fila = Queue()
-        fila.put(start)
-        visited.add(start)
-        parent = {start: None}
-        max_space = 1
-
-        while not fila.empty():
-            max_space = max(max_space, fila.qsize() + len(visited) + len(parent))
-
-            nodo_atual = fila.get()
-            if nodo_atual == end:
-                break
-
-            for edge in self.edges.get(nodo_atual, []):
-                adjacente = edge.v
-                if adjacente not in visited:
-                    if adjacente == end:
-                        parent[adjacente] = nodo_atual
-                        fila = Queue()  # Esvazia a fila para terminar o loop
-                        break
-                    fila.put(adjacente)
-                    parent[adjacente] = nodo_atual
-                    visited.add(adjacente)
-
-        path = []
-        if end in parent:  # Se um caminho foi encontrado
-            while end is not None:
-                path.append(end)
-                end = parent[end]
-            path.reverse()
-            custo = sum(edge.custo for edge in self.get_edges_along_path(path))
-        else:
-            custo = 0
+        csr, custos = self.csr, self.custos
+        key = (nome, fronteira, start, end, id(custos.base), custos.versao, self.landmarks)
+        resultado = self.cache.get(key, custos.base)
+        if resultado is not None:
+            # O tempo devolvido é o da procura original, para não distorcer as comparações dos algoritmos
+            path, custo, max_space, self.nos_expandidos, execution_time = resultado
+            return list(path), custo, max_space, execution_time
+        if start not in csr.index or end not in csr.index:
+            self.nos_expandidos = 0
+            return [], 0, 0, time.time() - start_time
+        i, j = csr.index[start], csr.index[end]
+        args = (heuristica(i, j),) if heuristica else ()
+        kwargs = {"frontier": FRONTEIRAS[fronteira]} if fronteira else {}
+        path, custo, max_space, self.nos_expandidos = procura(i, j, custos, *args, **kwargs)
+        path = [csr.ids[k] for k in path]
         execution_time = time.time() - start_time
+        self.cache.put(key, custos.base, (tuple(path), custo, max_space, self.nos_expandidos, execution_time))
         return path, custo, max_space, execution_time
 
+    # Fator mínimo custo/comprimento dos custos atuais (ver LandmarkHeuristic), calculado uma vez por
+    # estado dos custos
+    def _fator_landmarks(self):
+        custos = self.custos
+        if self._fator is None or self._fator[0] is not custos.base or self._fator[1] != custos.versao:
+            self._fator = (custos.base, custos.versao, LandmarkHeuristic.fator_minimo(custos, self.csr.lengths))
+        return self._fator[2]
+
+    # Vetor (lista, por índice do nó) guardado na cache de heurísticas, ou calculado com calcular() e
+    # guardado. base é o objeto de que o vetor depende (o CSR ou os landmarks)
+    def _vetor(self, key, base, calcular):
+        vetor = self.heuristicas.get(key, base)
+        if vetor is None:
+            vetor = calcular().tolist()
+            self.heuristicas.put(key, base, vetor)
+        return vetor
+
+    # Heurística até ao destino j, em função do índice do nó. O vetor de todos os nós é calculado de uma
+    # vez e guardado, por isso as consultas seguintes para o mesmo destino (ex.: os vários algoritmos e
+    # estafetas para a mesma entrega) não repetem o cálculo O(|V|)
+    def _heuristica_destino(self, i, j):
+        if self.landmarks is not None:
+            landmarks, fator = self.landmarks, self._fator_landmarks()
+
+            def calcular():
+                bounds = landmarks.lower_bounds(j)
+                return np.where(np.isinf(bounds), bounds, bounds * fator)
+
+            return self._vetor(('alt', j, fator), landmarks, calcular).__getitem__
+        return self._vetor(('haversine', j), self.csr,
+                           lambda: self._heuristica_many(np.arange(self.csr.num_nodes), j)).__getitem__
+
+    # Potencial médio (h_destino(v) - h_origem(v)) / 2 usado pelo A* bidirecional, a partir dos vetores
+    # guardados de cada extremo; só os nós alcançados pela procura são avaliados
+    def _potencial(self, i, j):
+        if self.landmarks is not None:
+            landmarks, metade = self.landmarks, self._fator_landmarks() / 2
+            # Limites infinitos passam a 0 para o potencial ser finito. Só acontecem em nós que não chegam a j
+            # (ou que não são alcançáveis de i); estes não têm arestas para nós que chegam a j (nem as recebem
+            # de nós alcançáveis de i), logo nunca estão num caminho de i para j e a consistência do potencial
+            # só é precisa no resto do grafo
+            para_j = self._vetor(('alt_para', j), landmarks, lambda: np.nan_to_num(landmarks.lower_bounds(j), posinf=0.0))
+            de_i = self._vetor(('alt_de', i), landmarks, lambda: np.nan_to_num(landmarks.lower_bounds_from(i), posinf=0.0))
+            return lambda v: (para_j[v] - de_i[v]) * metade
+        h_destino, h_origem = self._heuristica_destino(i, j), self._heuristica_destino(j, i)
+        return lambda v: (h_destino(v) - h_origem(v)) / 2
+
+    # Pré-calcula os landmarks da heurística ALT (partilhados pelos clones, pois só dependem da topologia)
+    def preprocess_landmarks(self, num_landmarks=8):
+        self.landmarks = LandmarkHeuristic.build(self.csr, num_landmarks)
+        return self.landmarks
+
+    def procura_BFS(self, start, end):
+        return self._procurar("BFS", self.csr.bfs, start, end)
+
     def procura_DFS(self, start, end):
-        start_time = time.time()
-        visited = set()
-        stack = [start]
-        parent = {start: None}
-        max_space = 1
-
-        while stack:
-            max_space = max(max_space, len(stack) + len(visited) + len(parent))
-
-            current = stack.pop()
-            if current == end:
-                parent[end] = parent.get(current)  # Certifica-se de que o end está em parent
-                break
-
-            if current not in visited:
-                visited.add(current)
-                for edge in self.edges.get(current, []):
-                    if edge.v not in visited:
-                        stack.append(edge.v)
-                        parent[edge.v] = current
-
-        path = []
-        if end in parent:  # Se um caminho foi encontrado
-            while end is not None:
-                path.append(end)
-                end = parent[end]
-            path.reverse()
-            custo = sum(edge.custo for edge in self.get_edges_along_path(path))
-        else:
-            custo = 0
-        execution_time = time.time() - start_time
-        return path, custo, max_space, execution_time
+        return self._procurar("DFS", self.csr.dfs, start, end)
 
     def greedy_best_first_search(self, start, end):
-        start_time = time.time()
-        open_set = []
-        heapq.heappush(open_set, (0, start))
-        came_from = {}
-        g_score = {node: float('inf') for node in self.nodes}
-        g_score[start] = 0
-        max_space = 0
-
-        while open_set:
-            max_space = max(max_space, len(open_set) + len(came_from) + len(g_score))
-            current = heapq.heappop(open_set)[1]
-
-            if current == end:
-                path = [end]
-                while current != start:
-                    current = came_from[current]
-                    path.append(current)
-                path.reverse()
-                custo = g_score[end]
-                execution_time = time.time() - start_time
-                return path, custo, max_space, execution_time
-
-            for edge in self.edges[current]:
-                neighbor = edge.v
-                tentative_g_score = g_score[current] + edge.custo
-                if tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
-                    if not any(neighbor == n[1] for n in open_set):
-                        heapq.heappush(open_set, (self.heuristic(neighbor, end), neighbor))
-        execution_time = time.time() - start_time
-        return [], 0, max_space, execution_time
+        return self._procurar("Greedy", self.csr.greedy, start, end, self._heuristica_destino)
 
-    def a_star_search(self, start, end):
-        start_time = time.time()
-        open_set = []
-        open_set_hash = set()
-        heapq.heappush(open_set, (0, start))
-        open_set_hash.add(start)
-        came_from = {}
-        g_score = {node: float('inf') for node in self.nodes}
-        g_score[start] = 0
-        f_score = {node: float('inf') for node in self.nodes}
-        f_score[start] = self.heuristic(start, end)
-
-        max_space = 0
-
-        while open_set:
-            max_space = max(max_space, len(open_set) + len(came_from) + len(g_score) + len(f_score))
-            current = heapq.heappop(open_set)[1]
-            open_set_hash.remove(current)
-
-            if current == end:
-                path = [current]
-                while current in came_from:
-                    current = came_from[current]
-                    path.append(current)
-                path.reverse()
-                execution_time = time.time() - start_time
-                return path, g_score[end], max_space, execution_time
-
-            for edge in self.edges[current]:
-                neighbor = edge.v
-                tentative_g_score = g_score[current] + edge.custo
-                if tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = tentative_g_score + self.heuristic(neighbor, end)
-                    if neighbor not in open_set_hash:
-                        heapq.heappush(open_set, (f_score[neighbor], neighbor))
-                        open_set_hash.add(neighbor)
+    def a_star_search(self, start, end, fronteira=None):
+        return self._procurar("A*", self.csr.a_star, start, end, self._heuristica_destino, fronteira)
 
-        execution_time = time.time() - start_time
-        return [], 0, max_space, execution_time
+    def bidirectional_dijkstra(self, start, end):
+        return self._procurar("Bi-Dijkstra", self.csr.bidirectional, start, end)
+
+    def bidirectional_a_star(self, start, end):
+        return self._procurar("Bi-A*", self.csr.bidirectional, start, end, self._potencial)
+
+    ############################################################################################################################################
+    #####################################         Matriz de distâncias             ##############################################################
+    ############################################################################################################################################
+
+    # Custos mínimos de cada origem para cada destino (matriz densa len(sources) x len(targets), inf quando
+    # não há caminho). Faz um Dijkstra por origem que pára assim que todos os destinos estão fixados.
+    # Com with_paths devolve também caminhos[i][j], a lista de IDs da origem i ao destino j ([] sem caminho).
+    # fronteira escolhe a fila de prioridade do Dijkstra (ver Frontier.FRONTEIRAS).
+    def distance_matrix(self, sources, targets, with_paths=False, fronteira=None):
+        csr, custos = self.csr, self.custos
+        index = csr.index
+        alvos = [index[t] for t in targets if t in index]
+        matriz = np.full((len(sources), len(targets)), np.inf)
+        caminhos = [[[] for _ in targets] for _ in sources] if with_paths else None
+        self.nos_expandidos = 0
+
+        for i, source in enumerate(sources):
+            if source not in index:
+                continue
+            dist, parent = csr.dijkstra_targets(index[source], alvos, custos, FRONTEIRAS[fronteira or "binary"])
+            self.nos_expandidos += len(dist)
+            for j, target in enumerate(targets):
+                v = index.get(target)
+                if v not in dist:
+                    continue
+                matriz[i, j] = dist[v]
+                if with_paths:
+                    caminho = []
+                    while v != -1:
+                        caminho.append(csr.ids[v])
+                        v = parent[v]
+                    caminho.reverse()
+                    caminhos[i][j] = caminho
+
+        if with_paths:
+            return matriz, caminhos
+        return matriz
+
+    ############################################################################################################################################
+    #################################         Contraction Hierarchies             ##############################################################
+    ############################################################################################################################################
+
+    # Hierarquia para o estado atual dos custos; é construída na primeira utilização e reaproveitada
+    # pelos clones com os mesmos custos (ex.: estafetas com o mesmo cenário de trânsito com seed).
+    # São guardadas as CAPACIDADE_HIERARQUIAS usadas mais recentemente.
+    def _hierarquia(self, hierarquia=None):
+        custos = self.custos
+        key = ('CH', id(custos.base), tuple(sorted(custos.deltas.items())))
+        if hierarquia is None:
+            hierarquia = self._hierarquias.get(key, custos.base)
+            if hierarquia is None:
+                hierarquia = ContractionHierarchy.build(self.csr, custos)
+        self._hierarquias.put(key, custos.base, hierarquia)
+        return hierarquia
+
+    # A hierarquia compensa quando é partilhada: para os custos do próprio grafo (também os estafetas
+    # cujo cenário não altera os comprimentos, ex.: Bicicleta) e para os cenários de trânsito com seed,
+    # comuns aos estafetas do mesmo transporte. Um cenário sem seed é de um só estafeta, que teria de
+    # construir a sua hierarquia para poucas consultas.
+    def ch_disponivel(self):
+        base = self.custos.base
+        return base is self.csr.lengths or self.transito.partilhado(base)
+
+    def preprocess_ch(self):
+        if "CH" not in self.procuras_extra:
+            self.procuras_extra.append("CH")
+        return self._hierarquia()
+
+    def save_ch(self, path):
+        self._hierarquia().save(path)
+
+    # Carrega uma hierarquia guardada com save_ch, assumindo que foi calculada com os custos atuais
+    def load_ch(self, path):
+        hierarquia = ContractionHierarchy.load(path)
+        if hierarquia.num_nodes != self.csr.num_nodes or hierarquia.num_arcs != self.csr.num_arcs:
+            raise ValueError("A hierarquia não corresponde a este grafo.")
+        if "CH" not in self.procuras_extra:
+            self.procuras_extra.append("CH")
+        self._hierarquia(hierarquia)
+
+    # O tempo devolvido é só o da consulta; o pré-processamento é feito uma vez por estado dos custos
+    def ch_search(self, start, end):
+        hierarquia = self._hierarquia()
+        return self._procurar("CH", lambda i, j, custos: hierarquia.search(i, j), start, end)
 
 ############################################################################################################################################
 #######################################         Desenhar Grafo             #################################################################
@@ -318,58 +644,188 @@ class Graph:
     def midpoint(point1, point2):
         return [(point1[0] + point2[0]) / 2, (point1[1] + point2[1]) / 2]
 
-    def desenhar_grafo(self, pontoCentral):
-        fig = go.Figure()
-        arestas_desenhadas = set()
-
-        # Desenhar arestas
-        for node_id, edges in self.edges.items():
-            for edge in edges:
-                if (edge.u, edge.v) in arestas_desenhadas or (edge.v, edge.u) in arestas_desenhadas:
+    # Nível de detalhe (índice de NIVEIS_DETALHE) para desenhar com a escala indicada: o mais simplificado
+    # cuja tolerância não passa de meio pixel
+    @staticmethod
+    def nivel_detalhe(unidades_por_pixel):
+        return max(k for k, tolerancia in enumerate(NIVEIS_DETALHE) if tolerancia <= unidades_por_pixel / 2)
+
+    # Nível de detalhe para desenhar o grafo inteiro com largura_px pixels
+    def nivel_para_largura(self, largura_px=LARGURA_FIGURA):
+        csr = self.csr
+        if csr.num_nodes == 0:
+            return 0
+        xs, ys = np.asarray(csr.xs), np.asarray(csr.ys)
+        return Graph.nivel_detalhe(max(np.ptp(xs), np.ptp(ys)) / largura_px)
+
+    # Coordenadas (xs, ys) de uma aresta: a geometria (já empacotada no CSR, com o nível de detalhe
+    # indicado) ou, se não existir, o segmento entre os dois nós
+    def coordenadas_aresta(self, edge, nivel=0):
+        csr = self.csr
+        line_coords = csr.geometries.nivel(nivel).points(csr.arc_road[edge.arc])
+        if line_coords:
+            xs, ys = zip(*line_coords)
+            return list(xs), list(ys)
+        start, end = self.nodes[edge.u].coordinates, self.nodes[edge.v].coordinates
+        return [start[0], end[0]], [start[1], end[1]]
+
+    # Coordenadas de várias linhas num só traço: as linhas ficam separadas por NaN (o None dos arrays
+    # numpy, que o plotly aceita sem validar ponto a ponto)
+    @staticmethod
+    def juntar_linhas(linhas):
+        xs, ys = [], []
+        for line_xs, line_ys in linhas:
+            xs.extend(line_xs)
+            xs.append(math.nan)
+            ys.extend(line_ys)
+            ys.append(math.nan)
+        return np.array(xs, dtype=float), np.array(ys, dtype=float)
+
+    # Geometria das estradas que não estão cortadas: as coordenadas de todas num só array (ver
+    # juntar_linhas) e, para os rótulos, o ponto médio e a aresta de cada uma. Calculada uma vez por
+    # topologia, nível de detalhe e conjunto de estradas cortadas; estradas com as mesmas pontas são
+    # desenhadas uma vez.
+    def _geometria_mapa(self, nivel=0):
+        csr, custos = self.csr, self.custos
+        cortadas = tuple(sorted(a for a, custo in custos.deltas.items() if custo == INF))
+        key = ('geometria', nivel, cortadas)
+        geometria = self.mapas.get(key, csr)
+        if geometria is None:
+            geometrias = csr.geometries.nivel(nivel)
+            coords = np.asarray(geometrias.coords).reshape(-1, 2)
+            offsets = geometrias.offsets
+            sources = np.repeat(np.arange(csr.num_nodes), np.diff(np.asarray(csr.offsets)))
+
+            # Primeira aresta não cortada de cada estrada
+            primeira = {}
+            arc_road = csr.arc_road
+            for a in range(csr.num_arcs):
+                if custos[a] != INF and arc_road[a] not in primeira:
+                    primeira[arc_road[a]] = a
+
+            separador = np.full((1, 2), math.nan)
+            partes, meios, arcs = [], [], []
+            arestas_desenhadas = set()
+            for r in sorted(primeira):
+                a = primeira[r]
+                u, v = int(sources[a]), csr.targets[a]
+                if (u, v) in arestas_desenhadas or (v, u) in arestas_desenhadas:
                     continue
-
-                line_coords = Graph.parse_linestring(edge.geometry)
-                arestas_desenhadas.add((edge.u, edge.v))  # Marcar a aresta como desenhada
-
-                if line_coords:
-                    x_coords, y_coords = zip(*line_coords)
-                    mid_pt = Graph.midpoint(line_coords[0], line_coords[-1])
-
-                    fig.add_trace(
-                        go.Scatter(x=x_coords, y=y_coords, mode='lines', name=edge.name, line=dict(color='grey')))
-
-                    fig.add_trace(go.Scatter(
-                        x=[mid_pt[0]], y=[mid_pt[1]],
-                        text=[f'{edge.name} ({edge.custo:.2f} m)'],
-                        mode='text', showlegend=False, textposition='bottom center', textfont=dict(size=5)))
-                else:
-                    start_node = self.nodes[edge.u]
-                    end_node = self.nodes[edge.v]
-                    mid_pt = Graph.midpoint(start_node.coordinates, end_node.coordinates)
-
-                    fig.add_trace(go.Scatter(
-                        x=[start_node.coordinates[0], end_node.coordinates[0]],
-                        y=[start_node.coordinates[1], end_node.coordinates[1]],
-                        mode='lines', name=edge.name, line=dict(color='grey')))
-
-                    fig.add_trace(go.Scatter(
-                        x=[mid_pt[0]], y=[mid_pt[1]],
-                        text=[f'{edge.name} ({edge.custo:.2f} m)'],
-                        mode='text', showlegend=False, textposition='bottom center', textfont=dict(size=5)))
-
-
-        for node_id, node in self.nodes.items():
-            if node_id == pontoCentral:
-                fig.add_trace(
-                    go.Scatter(x=[node.coordinates[0]], y=[node.coordinates[1]],
-                               text=[f'CENTRAL = {node_id}'], mode='markers+text', textposition='top center',
-                               marker=dict(color='red', size=10), textfont=dict(color='green', size=6),
-                               showlegend=False))
+                arestas_desenhadas.add((u, v))
+                linha = coords[offsets[r]:offsets[r + 1]]
+                if len(linha) == 0:
+                    linha = np.array([(csr.xs[u], csr.ys[u]), (csr.xs[v], csr.ys[v])])
+                partes.append(linha)
+                partes.append(separador)
+                meios.append((linha[0] + linha[-1]) / 2)
+                arcs.append(a)
+            pontos = np.concatenate(partes) if partes else np.empty((0, 2))
+            meios = np.array(meios).reshape(-1, 2)
+            geometria = (pontos[:, 0], pontos[:, 1], meios[:, 0], meios[:, 1], arcs)
+            self.mapas.put(key, csr, geometria)
+        return geometria
+
+    # Caixa envolvente (min_x, min_y, max_x, max_y) e nó de origem de cada estrada de _geometria_mapa
+    def _caixas_estradas(self):
+        csr, custos = self.csr, self.custos
+        cortadas = tuple(sorted(a for a, custo in custos.deltas.items() if custo == INF))
+        key = ('caixas', cortadas)
+        caixas = self.mapas.get(key, csr)
+        if caixas is None:
+            xs, ys, _, _, arcs = self._geometria_mapa()
+            arcs = np.array(arcs, dtype=np.int64)
+            sources = np.repeat(np.arange(csr.num_nodes), np.diff(np.asarray(csr.offsets)))
+            if len(arcs):
+                # Cada estrada ocupa os pontos entre dois separadores NaN
+                inicio = np.concatenate(([0], np.flatnonzero(np.isnan(xs))[:-1] + 1))
+                caixas = (arcs, sources[arcs], np.fmin.reduceat(xs, inicio), np.fmin.reduceat(ys, inicio),
+                          np.fmax.reduceat(xs, inicio), np.fmax.reduceat(ys, inicio))
             else:
-                fig.add_trace(
-                    go.Scatter(x=[node.coordinates[0]], y=[node.coordinates[1]],
-                               text=[node_id], mode='markers+text', textposition='top center',
-                               marker=dict(color='blue', size=5), textfont=dict(size=5), name=f'Node {node_id}'))
+                vazio = np.empty(0)
+                caixas = (arcs, arcs, vazio, vazio, vazio, vazio)
+            self.mapas.put(key, csr, caixas)
+        return caixas
+
+    # Arestas (uma por estrada desenhada) cuja caixa envolvente interseta o retângulo [x0, x1] x [y0, y1].
+    # Com escala (unidades por pixel em x e y) ignoram-se as estradas com menos de um pixel e, havendo
+    # mais de limite, ficam só as maiores no desenho.
+    def arestas_no_retangulo(self, x0, y0, x1, y1, escala=None, limite=None):
+        arcs, sources, min_x, min_y, max_x, max_y = self._caixas_estradas()
+        escolhidas = np.flatnonzero((max_x >= x0) & (min_x <= x1) & (max_y >= y0) & (min_y <= y1))
+        if escala is not None:
+            tamanho = np.maximum((max_x - min_x)[escolhidas] / escala[0], (max_y - min_y)[escolhidas] / escala[1])
+            escolhidas, tamanho = escolhidas[tamanho >= 1], tamanho[tamanho >= 1]
+            if limite is not None and len(escolhidas) > limite:
+                escolhidas = escolhidas[np.argpartition(-tamanho, limite)[:limite]]
+        csr = self.csr
+        ids, targets = csr.ids, csr.targets
+        return [ArcEdge(self, int(arcs[k]), ids[sources[k]], ids[targets[arcs[k]]]) for k in escolhidas]
+
+    # IDs dos nós dentro do retângulo [x0, x1] x [y0, y1]
+    def nos_no_retangulo(self, x0, y0, x1, y1):
+        csr = self.csr
+        xs, ys = np.asarray(csr.xs), np.asarray(csr.ys)
+        ids = csr.ids
+        return [ids[i] for i in np.flatnonzero((xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1))]
+
+    # Todas as arestas num único traço Scattergl e, com rotulos, os nomes e custos num único traço de texto
+    def tracos_arestas(self, rotulos=True, tamanho_texto=5, nivel=0):
+        xs, ys, _, _, _ = self._geometria_mapa(nivel)
+        tracos = [go.Scattergl(x=xs, y=ys, mode='lines', line=dict(color='grey'), hoverinfo='skip',
+                               showlegend=False)]
+        if rotulos:
+            tracos.append(self.traco_rotulos(tamanho_texto, nivel))
+        return tracos
+
+    # Nomes das ruas e custos atuais das arestas desenhadas, num único traço de texto
+    def traco_rotulos(self, tamanho_texto=5, nivel=0):
+        _, _, mid_xs, mid_ys, arcs = self._geometria_mapa(nivel)
+        csr, custos = self.csr, self.custos
+        textos = np.array([f'{csr.names[csr.road_name[csr.arc_road[a]]]} ({custos[a]:.2f} m)' for a in arcs])
+        return go.Scattergl(x=mid_xs, y=mid_ys, text=textos, mode='text', textposition='bottom center',
+                            textfont=dict(size=tamanho_texto), hoverinfo='skip', showlegend=False)
+
+    # Todos os nós (exceto os de excluir) num único traço de marcadores, com o ID como rótulo
+    def traco_nos(self, rotulos=True, excluir=(), tamanho_texto=5):
+        csr = self.csr
+        ids = np.array([node_id not in excluir for node_id in csr.ids], dtype=bool)
+        return go.Scattergl(x=np.asarray(csr.xs)[ids], y=np.asarray(csr.ys)[ids], text=np.array(csr.ids)[ids],
+                            mode='markers+text' if rotulos else 'markers', textposition='top center',
+                            marker=dict(color='blue', size=5), textfont=dict(size=tamanho_texto),
+                            hoverinfo='text', showlegend=False)
+
+    # Figura com o mapa base: as arestas e os nós só dependem da topologia (e das estradas cortadas), por
+    # isso ficam em cache e são partilhados por todos os estafetas; os rótulos com o custo de cada aresta
+    # são acrescentados por cima a cada desenho. Devolve uma cópia, à qual se acrescentam os caminhos e
+    # marcadores de cada desenho. Por omissão o nível de detalhe das geometrias é o adequado a uma figura
+    # com o grafo inteiro (nivel=0 usa a geometria original).
+    def mapa_base(self, rotulos=True, tamanho_texto=5, rotulos_nos=False, excluir=(), nivel=None):
+        csr, custos = self.csr, self.custos
+        if nivel is None:
+            nivel = self.nivel_para_largura()
+        cortadas = tuple(sorted(a for a, custo in custos.deltas.items() if custo == INF))
+        key = ('mapa', rotulos_nos, tuple(sorted(excluir)), nivel, cortadas)
+        fig = self.mapas.get(key, csr)
+        if fig is None:
+            fig = go.Figure(self.tracos_arestas(False, nivel=nivel) + [self.traco_nos(rotulos_nos, excluir)])
+            self.mapas.put(key, csr, fig)
+        fig = go.Figure(fig)
+        if rotulos:
+            fig.add_trace(self.traco_rotulos(tamanho_texto, nivel))
+        return fig
+
+    # As arestas e os nós são desenhados em poucos traços (ver tracos_arestas), o que mantém a figura
+    # leve mesmo no grafo grande; com rotulos=False não são desenhados os nomes das ruas nem os IDs
+    def desenhar_grafo(self, pontoCentral, rotulos=True, nivel=None):
+        # Arestas e nós (mapa base em cache) e o ponto central por cima
+        fig = self.mapa_base(rotulos, rotulos_nos=rotulos, excluir={pontoCentral}, nivel=nivel)
+        if pontoCentral in self.nodes:
+            node = self.nodes[pontoCentral]
+            fig.add_trace(
+                go.Scatter(x=[node.coordinates[0]], y=[node.coordinates[1]],
+                           text=[f'CENTRAL = {pontoCentral}'], mode='markers+text', textposition='top center',
+                           marker=dict(color='red', size=10), textfont=dict(color='green', size=6),
+                           showlegend=False))
 
         # Configurações do layout
         fig.update_layout(title='Grafo', hovermode='closest', showlegend=False,
@@ -0,0 +1,97 @@
+from array import array
+
+import numpy as np
+
+from CostOverlay import CostOverlay
+
+# Número de landmarks usados por omissão
+NUM_LANDMARKS = 8
+
+
+# Heurística ALT (A*, Landmarks, desigualdade triangular). Para cada landmark l guarda-se
+# d(l, v) e d(v, l) em metros; pela desigualdade triangular, d(v, t) >= d(l, t) - d(l, v) e
+# d(v, t) >= d(v, l) - d(t, l). As distâncias são calculadas sobre o comprimento das estradas,
+# por isso o limite é multiplicado pelo menor fator custo/comprimento do grafo para continuar
+# admissível com trânsito (ex.: 0.3 para a Moto com trânsito leve).
+class LandmarkHeuristic:
+    def __init__(self, landmarks, dist_from, dist_to):
+        self.landmarks = landmarks
+        self.dist_from = dist_from  # k x n: d(l, v)
+        self.dist_to = dist_to  # k x n: d(v, l)
+
+    @staticmethod
+    def build(csr, num_landmarks=NUM_LANDMARKS):
+        lengths = CostOverlay(csr.lengths)
+        n = csr.num_nodes
+        landmarks, dist_from, dist_to = [], [], []
+        if n == 0:
+            return LandmarkHeuristic(landmarks, np.zeros((0, 0)), np.zeros((0, 0)))
+
+        # Seleção pelo ponto mais afastado: começa no nó mais longe do nó 0 e escolhe
+        # sempre o nó cuja distância ao landmark mais próximo é máxima
+        d0 = np.array(csr.dijkstra(0, lengths))
+        candidate = int(np.argmax(np.where(np.isfinite(d0), d0, -1)))
+        closest = np.full(n, np.inf)
+        for _ in range(min(num_landmarks, n)):
+            landmarks.append(candidate)
+            dist_from.append(csr.dijkstra(candidate, lengths))
+            dist_to.append(csr.dijkstra(candidate, lengths, reverse=True))
+            closest = np.minimum(closest, np.array(dist_from[-1]))
+            # Nós inalcançáveis pelos landmarks atuais passam à frente (outra componente ligada)
+            score = np.where(np.isfinite(closest), closest, np.finfo(float).max)
+            score[landmarks] = -1
+            candidate = int(np.argmax(score))
+            if score[candidate] <= 0:
+                break
+
+        return LandmarkHeuristic(landmarks, np.array(dist_from), np.array(dist_to))
+
+    # Secções para o formato binário do grafo (ver Graph.to_bytes)
+    def sections(self):
+        return [(b'lmids', array('i', self.landmarks)),
+                (b'lmfrom', np.ascontiguousarray(self.dist_from, dtype=np.float64)),
+                (b'lmto', np.ascontiguousarray(self.dist_to, dtype=np.float64))]
+
+    # Os arrays ficam apontados para o buffer, sem cópia
+    @staticmethod
+    def from_sections(sections, num_nodes):
+        landmarks = list(sections[b'lmids'].cast('i'))
+        shape = (len(landmarks), num_nodes)
+        dist_from = np.frombuffer(sections[b'lmfrom'], dtype=np.float64).reshape(shape)
+        dist_to = np.frombuffer(sections[b'lmto'], dtype=np.float64).reshape(shape)
+        return LandmarkHeuristic(landmarks, dist_from, dist_to)
+
+    # Limite inferior (em metros de comprimento) de todos os nós até ao destino t, num único cálculo
+    def lower_bounds(self, t):
+        with np.errstate(invalid='ignore'):
+            forward = self.dist_from[:, t:t + 1] - self.dist_from  # d(l, t) - d(l, v)
+            backward = self.dist_to - self.dist_to[:, t:t + 1]  # d(v, l) - d(t, l)
+            bounds = np.fmax(np.fmax.reduce(forward, axis=0), np.fmax.reduce(backward, axis=0))
+        # nan quando nenhum landmark dá informação; inf quando t é inalcançável a partir de v
+        return np.maximum(np.nan_to_num(bounds, nan=0.0, posinf=np.inf), 0.0)
+
+    # Função h(v) para o A*, já escalada pelo fator mínimo custo/comprimento
+    def heuristic_to(self, t, fator=1.0):
+        bounds = self.lower_bounds(t)
+        bounds = np.where(np.isinf(bounds), bounds, bounds * fator)
+        return bounds.tolist().__getitem__
+
+    # Limite inferior de d(s, v) para todos os nós: d(l, v) - d(l, s) e d(s, l) - d(v, l)
+    def lower_bounds_from(self, s):
+        with np.errstate(invalid='ignore'):
+            forward = self.dist_from - self.dist_from[:, s:s + 1]
+            backward = self.dist_to[:, s:s + 1] - self.dist_to
+            bounds = np.fmax(np.fmax.reduce(forward, axis=0), np.fmax.reduce(backward, axis=0))
+        return np.maximum(np.nan_to_num(bounds, nan=0.0, posinf=np.inf), 0.0)
+
+    # Menor razão custo/comprimento entre as arestas (com comprimento positivo) de um CostOverlay
+    @staticmethod
+    def fator_minimo(costs, lengths):
+        lengths = np.frombuffer(lengths, dtype=np.float64)
+        base = np.frombuffer(costs.base, dtype=np.float64)
+        positive = lengths > 0
+        fator = float(np.min(base[positive] / lengths[positive])) if positive.any() else 1.0
+        for a, c in costs.deltas.items():
+            if lengths[a] > 0:
+                fator = min(fator, c / lengths[a])
+        return max(fator, 0.0)
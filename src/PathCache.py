@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+# Número de resultados guardados por omissão
+CACHE_CAPACIDADE = 4096
+
+
+# Cache LRU de resultados de procuras. A chave identifica a procura (algoritmo, origem, destino
+# e versão dos custos); cada entrada guarda também o vetor base dos custos, para que um vetor
+# novo criado no mesmo endereço de memória não reaproveite resultados antigos.
+class PathCache:
+    def __init__(self, capacidade=CACHE_CAPACIDADE):
+        self.capacidade = capacidade  # 0 desativa a cache
+        self._entradas = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, base):
+        entry = self._entradas.get(key)
+        if entry is None or entry[0] is not base:
+            self.misses += 1
+            return None
+        self._entradas.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, base, value):
+        if self.capacidade <= 0:
+            return
+        self._entradas[key] = (base, value)
+        self._entradas.move_to_end(key)
+        while len(self._entradas) > self.capacidade:
+            self._entradas.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def estatisticas(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entradas": len(self._entradas), "capacidade": self.capacidade}
@@ -0,0 +1,111 @@
+import time
+
+from assignment import PENALIZACAO_ATRASO
+
+
+# Reordena as entregas de um estafeta para reduzir o custo da rota a partir do ponto de recolha.
+# O custo de uma ordem é o tempo de viagem (km pela rede a dividir pela velocidade efetiva para a carga
+# que ainda vai a bordo, que diminui a cada entrega) mais PENALIZACAO_ATRASO por cada hora além do prazo de
+# cada entrega. Parte da melhor de três ordens (a atual, por prazo e vizinho mais próximo) e melhora-a com
+# 2-opt e Or-opt até não haver melhoria ou acabar o tempo_limite (segundos por estafeta).
+class RouteOptimizer:
+    TEMPO_LIMITE = 0.05
+    SEGMENTO_OR_OPT = 3  # maior segmento movido pelo Or-opt
+
+    def __init__(self, tempo_limite=TEMPO_LIMITE):
+        self.tempo_limite = tempo_limite
+        # Distâncias (m) entre paragens por estado dos custos: (id(base), versao) -> (base, {origem: {destino: m}}).
+        # Guarda-se a base para o id não ser reutilizado enquanto a entrada existir
+        self._distancias = {}
+
+    # Matriz de distâncias (km) entre as paragens, pelos custos atuais do grafo; só as origens que
+    # ainda não têm todos os destinos na cache fazem um Dijkstra
+    def matriz(self, graph, paragens):
+        custos = graph.custos
+        _, linhas = self._distancias.setdefault((id(custos.base), custos.versao), (custos.base, {}))
+        unicas = list(dict.fromkeys(paragens))
+        em_falta = [u for u in unicas if u not in linhas or any(v not in linhas[u] for v in unicas)]
+        if em_falta:
+            for u, linha in zip(em_falta, graph.distance_matrix(em_falta, unicas).tolist()):
+                linhas.setdefault(u, {}).update(zip(unicas, linha))
+        return [[linhas[u][v] / 1000 for v in paragens] for u in paragens]
+
+    # Custo de visitar as entregas pela ordem dada (índices das entregas; a paragem 0 é o ponto de partida)
+    @staticmethod
+    def custo(ordem, dist, pesos, prazos, courier):
+        carga = sum(pesos)
+        tempo = atraso = 0.0
+        anterior = 0
+        for k in ordem:
+            tempo += dist[anterior][k + 1] / courier.calculate_effective_speed(carga)
+            atraso += max(tempo - prazos[k], 0.0)
+            carga -= pesos[k]
+            anterior = k + 1
+        return tempo + PENALIZACAO_ATRASO * atraso
+
+    @staticmethod
+    def vizinho_mais_proximo(dist, n):
+        ordem, por_visitar = [], set(range(n))
+        anterior = 0
+        while por_visitar:
+            k = min(por_visitar, key=lambda k: (dist[anterior][k + 1], k))
+            ordem.append(k)
+            por_visitar.remove(k)
+            anterior = k + 1
+        return ordem
+
+    # Ordens vizinhas: 2-opt (inverter um troço; a rota não volta ao início, por isso o fim também pode
+    # ser invertido) e Or-opt (mover um segmento de 1 a SEGMENTO_OR_OPT entregas para outra posição)
+    def vizinhas(self, ordem):
+        n = len(ordem)
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                yield ordem[:i] + ordem[i:j + 1][::-1] + ordem[j + 1:]
+        for tamanho in range(1, min(self.SEGMENTO_OR_OPT, n - 1) + 1):
+            for i in range(n - tamanho + 1):
+                segmento = ordem[i:i + tamanho]
+                resto = ordem[:i] + ordem[i + tamanho:]
+                for p in range(len(resto) + 1):
+                    if p != i:
+                        yield resto[:p] + segmento + resto[p:]
+
+    # Procura local com a primeira melhoria encontrada
+    def melhorar(self, ordem, avaliar, fim):
+        melhor = avaliar(ordem)
+        melhorou = True
+        while melhorou:
+            melhorou = False
+            for vizinha in self.vizinhas(ordem):
+                if time.perf_counter() >= fim:
+                    return ordem, melhor
+                custo = avaliar(vizinha)
+                if custo < melhor - 1e-12:
+                    ordem, melhor, melhorou = vizinha, custo, True
+                    break
+        return ordem, melhor
+
+    # Reordena courier.deliveries (na própria lista) e atualiza a rota do estafeta; usa o grafo do
+    # estafeta (com o cenário de trânsito). Devolve o custo da ordem inicial e o da ordem final.
+    def otimizar(self, courier):
+        deliveries = courier.deliveries
+        n = len(deliveries)
+        if n == 0:
+            return 0.0, 0.0
+        dist = self.matriz(courier.graph, [courier.current_node] + [d.destination_node for d in deliveries])
+        pesos = [delivery.weight for delivery in deliveries]
+        prazos = [float(delivery.deadline) for delivery in deliveries]
+
+        def avaliar(ordem):
+            return self.custo(ordem, dist, pesos, prazos, courier)
+
+        inicio = time.perf_counter()
+        original = list(range(n))
+        custo_inicial = avaliar(original)
+        ordem = min([original, sorted(original, key=prazos.__getitem__), self.vizinho_mais_proximo(dist, n)],
+                    key=avaliar)
+        ordem, custo = self.melhorar(ordem, avaliar, inicio + self.tempo_limite)
+        if custo >= custo_inicial:
+            return custo_inicial, custo_inicial
+        deliveries[:] = [deliveries[k] for k in ordem]
+        courier.recalculate_route()
+        return custo_inicial, custo
@@ -0,0 +1,34 @@
+# Geração máxima antes de os carimbos serem limpos
+_MAX_GERACAO = 2 ** 31 - 1
+
+
+# Vetores reutilizados entre procuras sobre o mesmo grafo. Em vez de reinicializar os vetores em
+# cada consulta, cada posição guarda a geração em que foi escrita; valores de gerações anteriores
+# contam como vazios, por isso começar uma procura nova (reset) é O(1).
+class SearchWorkspace:
+    def __init__(self, num_nodes):
+        self.generation = 0
+        self.stamp = [0] * num_nodes  # geração em que g, f e parent foram escritos
+        self.open_stamp = [0] * num_nodes  # geração em que o nó está na fila de prioridade
+        self.g = [0.0] * num_nodes
+        self.f = [0.0] * num_nodes
+        self.parent = [-1] * num_nodes
+
+    def reset(self):
+        if self.generation == _MAX_GERACAO:
+            n = len(self.stamp)
+            self.stamp = [0] * n
+            self.open_stamp = [0] * n
+            self.generation = 0
+        self.generation += 1
+        return self.generation
+
+    # Caminho até end pelos pais escritos na geração atual
+    def path_to(self, end):
+        path = []
+        parent = self.parent
+        while end != -1:
+            path.append(end)
+            end = parent[end]
+        path.reverse()
+        return path
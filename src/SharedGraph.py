@@ -0,0 +1,61 @@
+import gc
+import sys
+from multiprocessing import shared_memory
+
+from Graph import Graph
+
+
+# Grafo publicado num bloco de memória partilhada, no formato dos snapshots (topologia, custos
+# atuais e landmarks em arrays planos). Os outros processos ligam-se pelo nome e obtêm um Graph
+# cujos arrays apontam para a memória partilhada: não há cópia nem pickling do grafo, por isso
+# ligar-se custa o mesmo seja qual for o tamanho do grafo. O grafo é só de leitura; cada processo
+# pode fazer clone() e alterar os custos do clone.
+class SharedGraph:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner  # o processo que publicou é o responsável por libertar a memória
+        self._graph = None
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @staticmethod
+    def publish(graph):
+        data = graph.to_bytes()
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        shm.buf[:len(data)] = data
+        return SharedGraph(shm, True)
+
+    @staticmethod
+    def attach(name):
+        # Só o processo que publicou deve libertar o bloco. Antes do Python 3.13 não é possível desligar
+        # o registo no resource_tracker, que é partilhado com os processos criados pelo multiprocessing
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        return SharedGraph(shm, False)
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = Graph.from_buffer(self.shm.buf)
+        return self._graph
+
+    def close(self):
+        if self._graph is not None:
+            self._graph = None
+            gc.collect()  # o grafo e os clones podem ficar em ciclos de referências que apontam para o bloco
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # ainda há arrays a apontar para o bloco (ex.: clones do grafo); fecha com o processo
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
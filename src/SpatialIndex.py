@@ -0,0 +1,98 @@
+import heapq
+import math
+
+# Metros por grau (raio médio da Terra de 6371 km, como na heurística de Haversine)
+METROS_POR_GRAU = math.radians(1) * 6371000.0
+
+# Número médio de nós por célula da grelha
+NOS_POR_CELULA = 2
+
+
+# Grelha uniforme sobre as coordenadas (longitude, latitude) dos nós. As coordenadas são projetadas
+# em metros (equiretangular, centrada na latitude média), o que é suficiente à escala de uma cidade.
+# As consultas recebem coordenadas no mesmo formato de Node.coordinates e devolvem IDs.
+class SpatialIndex:
+    def __init__(self, ids, xs, ys):
+        self.ids = ids
+        n = len(ids)
+        lat0 = sum(ys) / n if n else 0.0
+        self.kx = METROS_POR_GRAU * math.cos(math.radians(lat0))
+        self.ky = METROS_POR_GRAU
+        self.px = [x * self.kx for x in xs]
+        self.py = [y * self.ky for y in ys]
+
+        if n:
+            self.min_x, self.min_y = min(self.px), min(self.py)
+            largura = max(self.px) - self.min_x
+            altura = max(self.py) - self.min_y
+            self.celula = math.sqrt(max(largura * altura, 1.0) * NOS_POR_CELULA / n) or 1.0
+        else:
+            self.min_x = self.min_y = 0.0
+            self.celula = 1.0
+        self.colunas = int((max(self.px, default=0.0) - self.min_x) // self.celula) + 1
+        self.linhas = int((max(self.py, default=0.0) - self.min_y) // self.celula) + 1
+
+        self.celulas = {}  # (coluna, linha) -> índices dos nós
+        for i in range(n):
+            self.celulas.setdefault(self._celula(self.px[i], self.py[i]), []).append(i)
+
+    def _celula(self, px, py):
+        return int((px - self.min_x) // self.celula), int((py - self.min_y) // self.celula)
+
+    # Índices dos nós nas células à distância (de Chebyshev) r da célula (cx, cy)
+    def _anel(self, cx, cy, r):
+        celulas = self.celulas
+        if r == 0:
+            yield from celulas.get((cx, cy), ())
+            return
+        for dx in range(-r, r + 1):
+            yield from celulas.get((cx + dx, cy - r), ())
+            yield from celulas.get((cx + dx, cy + r), ())
+        for dy in range(-r + 1, r):
+            yield from celulas.get((cx - r, cy + dy), ())
+            yield from celulas.get((cx + r, cy + dy), ())
+
+    # Percorre anéis de células até os k melhores estarem garantidos; devolve [(distância, índice)]
+    def _k_mais_proximos(self, x, y, k):
+        px, py = x * self.kx, y * self.ky
+        cx, cy = self._celula(px, py)
+        # Último anel que ainda contém células da grelha
+        max_r = max(abs(cx), abs(cy), abs(self.colunas - 1 - cx), abs(self.linhas - 1 - cy))
+        melhores = []  # max-heap de (-distância, índice)
+        r = 0
+        while r <= max_r:
+            for i in self._anel(cx, cy, r):
+                d = math.hypot(self.px[i] - px, self.py[i] - py)
+                if len(melhores) < k:
+                    heapq.heappush(melhores, (-d, i))
+                elif d < -melhores[0][0]:
+                    heapq.heapreplace(melhores, (-d, i))
+            # Os nós de anéis seguintes estão a pelo menos r células de distância
+            if len(melhores) == k and -melhores[0][0] <= r * self.celula:
+                break
+            r += 1
+        return sorted((-d, i) for d, i in melhores)
+
+    def nearest_node(self, x, y):
+        resultado = self._k_mais_proximos(x, y, 1)
+        return self.ids[resultado[0][1]] if resultado else None
+
+    def k_nearest(self, x, y, k):
+        if k <= 0:
+            return []
+        return [self.ids[i] for _, i in self._k_mais_proximos(x, y, k)]
+
+    # Nós a menos de radius metros do ponto, do mais próximo para o mais afastado
+    def nodes_within(self, x, y, radius):
+        px, py = x * self.kx, y * self.ky
+        c0, l0 = self._celula(px - radius, py - radius)
+        c1, l1 = self._celula(px + radius, py + radius)
+        encontrados = []
+        for cx in range(max(c0, 0), min(c1, self.colunas - 1) + 1):
+            for cy in range(max(l0, 0), min(l1, self.linhas - 1) + 1):
+                for i in self.celulas.get((cx, cy), ()):
+                    d = math.hypot(self.px[i] - px, self.py[i] - py)
+                    if d <= radius:
+                        encontrados.append((d, i))
+        encontrados.sort()
+        return [self.ids[i] for _, i in encontrados]
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Estados de trânsito de cada aresta, pela ordem usada nos multiplicadores
+ESTADOS = ("Normal", "Congestionado", "Leve")
+
+# Multiplicador do comprimento da estrada por tipo de transporte e estado de trânsito
+MULTIPLICADORES = {
+    'Bicicleta': (1.0, 1.0, 1.0),
+    'Moto': (1.0, 1.0, 0.3),
+    'Carro': (1.0, 1.5, 0.8),
+}
+
+# Número de cenários com seed guardados (os menos usados recentemente são descartados)
+CAPACIDADE_CENARIOS = 8
+
+
+# Gera cenários de trânsito para todas as arestas de uma vez. Com a mesma seed o estado de
+# cada estrada é o mesmo para todos os tipos de transporte, o que permite comparar
+# algoritmos e estafetas em condições idênticas.
+class TrafficModel:
+    def __init__(self, lengths):
+        self._comprimentos = lengths  # o vetor original (ex.: csr.lengths)
+        self.lengths = np.frombuffer(lengths, dtype=np.float64)
+        self._cenarios = OrderedDict()  # (transporte, seed) -> vetor de custos, por ordem de utilização
+
+    def estados(self, seed=None):
+        rng = np.random.default_rng(seed)
+        return rng.integers(0, len(ESTADOS), size=len(self.lengths), dtype=np.int8)
+
+    def multiplicadores(self, transport, seed=None):
+        fatores = np.array(MULTIPLICADORES.get(transport, (1.0, 1.0, 1.0)))
+        return fatores[self.estados(seed)]
+
+    # Vetor de custos (comprimento x multiplicador) pronto a usar como base de um CostOverlay.
+    # Os últimos CAPACIDADE_CENARIOS cenários com seed são guardados e partilhados entre grafos; um
+    # transporte cujos multiplicadores são todos 1 usa os próprios comprimentos.
+    def custos(self, transport, seed=None):
+        if all(fator == 1.0 for fator in MULTIPLICADORES.get(transport, (1.0, 1.0, 1.0))):
+            return self._comprimentos
+        key = (transport, seed)
+        if seed is not None and key in self._cenarios:
+            self._cenarios.move_to_end(key)
+            return self._cenarios[key]
+        custos = memoryview(self.lengths * self.multiplicadores(transport, seed))
+        if seed is not None:
+            self._cenarios[key] = custos
+            if len(self._cenarios) > CAPACIDADE_CENARIOS:
+                self._cenarios.popitem(last=False)
+        return custos
+
+    # O vetor de custos é partilhado por vários grafos: os comprimentos ou um cenário com seed guardado
+    def partilhado(self, base):
+        return base is self._comprimentos or any(base is custos for custos in self._cenarios.values())
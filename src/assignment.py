@@ -0,0 +1,188 @@
+import contextlib
+import copy
+import io
+import time
+
+import numpy as np
+
+# Custo (em horas) por cada hora de atraso em relação ao prazo da entrega
+PENALIZACAO_ATRASO = 10.0
+# Custo de deixar uma entrega por atribuir; tem de ser maior que o custo de qualquer atribuição possível
+CUSTO_NAO_ATRIBUIDA = 1e4
+# Custo usado no solver para os pares impossíveis (acima de CUSTO_NAO_ATRIBUIDA, nunca são escolhidos)
+CUSTO_IMPOSSIVEL = 1e6
+
+
+# Custo de cada entrega (linhas) por cada estafeta (colunas): tempo de viagem pela rede desde o ponto
+# do estafeta, com a velocidade efetiva para a carga atual mais o peso da entrega, mais PENALIZACAO_ATRASO
+# por hora além do prazo. Os pares impossíveis (peso acima da capacidade livre, destino inalcançável,
+# estafeta indisponível) ficam com custo infinito.
+def matriz_custos(graph, couriers, deliveries):
+    origens = list(dict.fromkeys(courier.current_node for courier in couriers))
+    linha_origem = {origem: k for k, origem in enumerate(origens)}
+    distancias = graph.distance_matrix(origens, [delivery.destination_node for delivery in deliveries]) / 1000
+    pesos = np.array([delivery.weight for delivery in deliveries], dtype=float)
+    prazos = np.array([float(delivery.deadline) for delivery in deliveries])
+    pesos_unicos, posicao = np.unique(pesos, return_inverse=True)
+
+    custos = np.full((len(deliveries), len(couriers)), np.inf)
+    for c, courier in enumerate(couriers):
+        if not courier.is_available:
+            continue
+        velocidades = np.array([courier.calculate_effective_speed(courier.current_load + peso)
+                                for peso in pesos_unicos])[posicao]
+        tempos = distancias[linha_origem[courier.current_node]] / velocidades
+        custo = tempos + PENALIZACAO_ATRASO * np.maximum(tempos - prazos, 0)
+        custo[courier.current_load + pesos > courier.max_weight] = np.inf
+        custos[:, c] = custo
+    return custos
+
+
+# Atribuição de custo mínimo das linhas (entregas) às colunas (estafetas), com no máximo capacidades[c]
+# linhas na coluna c: fluxo de custo mínimo por caminhos de aumento mais curtos (o método húngaro
+# generalizado para colunas com capacidade). As linhas entram uma a uma; cada caminho de aumento passa de
+# estafeta em estafeta, movendo uma entrega de um estafeta cheio para outro, até um estafeta com lugar.
+# O Dijkstra é feito só sobre as colunas, com potenciais (custos reduzidos não negativos): uma entrega
+# atribuída fica com o potencial do seu estafeta, por isso não precisa de nó próprio. Os custos têm de ser
+# finitos e a soma das capacidades >= número de linhas. Devolve a coluna de cada linha.
+def fluxo_custo_minimo(custos, capacidades):
+    n, k = custos.shape
+    pi = np.zeros(k)  # potenciais das colunas
+    pi_fim = 0.0  # potencial do destino (ligado a cada coluna com lugar)
+    coluna = np.full(n, -1, dtype=np.intp)
+    linhas = [[] for _ in range(k)]  # linhas atribuídas a cada coluna
+    ocupacao = np.zeros(k, dtype=np.intp)
+    # Por coluna c: o menor custo de passar uma das suas linhas para cada outra coluna (custos[r, c'] - custos[r, c])
+    # e a linha que o consegue; só muda quando as linhas de c mudam
+    trocas = {}
+
+    def troca(c):
+        if c not in trocas:
+            r = np.array(linhas[c], dtype=np.intp)
+            diferencas = custos[r] - custos[r, c][:, None]
+            melhor = np.argmin(diferencas, axis=0)
+            trocas[c] = (diferencas[melhor, np.arange(k)], r[melhor])
+        return trocas[c]
+
+    for i in range(n):
+        # Potencial da linha nova: o maior que mantém os custos reduzidos i -> c não negativos
+        reduzidos = custos[i] - pi
+        dist = reduzidos - reduzidos.min()
+        anterior = np.full(k, -1, dtype=np.intp)  # coluna anterior no caminho (-1: a linha nova)
+        movida = np.full(k, -1, dtype=np.intp)  # linha que passa da coluna anterior para esta
+        fixada = np.zeros(k, dtype=bool)
+        dist_fim, ultima = np.inf, -1
+        while True:
+            candidatos = np.where(fixada, np.inf, dist)
+            c = int(np.argmin(candidatos))
+            if candidatos[c] >= dist_fim:
+                break
+            fixada[c] = True
+            if ocupacao[c] < capacidades[c]:
+                # Aresta c -> destino (custo reduzido pi[c] - pi_fim >= 0)
+                if dist[c] + pi[c] - pi_fim < dist_fim:
+                    dist_fim, ultima = dist[c] + pi[c] - pi_fim, c
+                continue
+            if not linhas[c]:
+                continue  # coluna sem lugares
+            # Coluna cheia: uma das suas linhas pode passar para outra coluna
+            diferencas, r = troca(c)
+            via = dist[c] + pi[c] - pi + diferencas
+            melhora = (via < dist) & ~fixada
+            dist[melhora] = via[melhora]
+            anterior[melhora] = c
+            movida[melhora] = r[melhora]
+
+        # Atualiza os potenciais e inverte o caminho de aumento
+        pi += np.minimum(dist, dist_fim)
+        pi_fim += dist_fim
+        c = ultima
+        ocupacao[c] += 1
+        while anterior[c] != -1:
+            r, origem = movida[c], anterior[c]
+            linhas[origem].remove(r)
+            linhas[c].append(r)
+            coluna[r] = c
+            trocas.pop(c, None)
+            c = origem
+        linhas[c].append(i)
+        coluna[i] = c
+        trocas.pop(c, None)
+    return coluna
+
+
+# Lugares de cada estafeta: quantas das entregas mais leves cabem na capacidade livre
+def lugares(pesos, livres):
+    acumulado = np.cumsum(np.sort(pesos))
+    return np.searchsorted(acumulado, np.maximum(livres, 0), side='right')
+
+
+# Atribuição ótima das entregas (linhas de custos) aos estafetas (colunas) com a capacidade livre de cada
+# estafeta. O solver trabalha com número de lugares (ver lugares); depois, as entregas que excedem o peso de um
+# estafeta (as de maior custo) e as que ficaram sem lugar passam para o estafeta mais barato que ainda
+# tenha capacidade. Devolve o índice do estafeta de cada entrega, ou -1 se ficar por atribuir.
+def atribuir_otimo(custos, pesos, livres):
+    n, k = custos.shape
+    if n == 0 or k == 0:
+        return np.full(n, -1, dtype=np.intp)
+
+    # Coluna extra (por atribuir) com lugar para todas as entregas
+    compacta = np.hstack([np.where(np.isinf(custos), CUSTO_IMPOSSIVEL, custos), np.full((n, 1), CUSTO_NAO_ATRIBUIDA)])
+    estafeta = fluxo_custo_minimo(compacta, np.append(lugares(pesos, livres), n))
+    linhas = np.arange(n)
+    estafeta[(estafeta == k) | np.isinf(custos[linhas, np.minimum(estafeta, k - 1)])] = -1
+
+    # Reparação das capacidades em peso
+    carga = np.zeros(k)
+    sem_lugar = [i for i in range(n) if estafeta[i] < 0]
+    for i in np.argsort(custos[linhas, np.maximum(estafeta, 0)], kind='stable'):
+        c = estafeta[i]
+        if c < 0:
+            continue
+        if carga[c] + pesos[i] <= livres[c]:
+            carga[c] += pesos[i]
+        else:
+            estafeta[i] = -1
+            sem_lugar.append(i)
+    sem_lugar.sort(key=lambda i: np.min(custos[i]))
+    for i in sem_lugar:
+        possiveis = np.flatnonzero((carga + pesos[i] <= livres) & np.isfinite(custos[i]))
+        if len(possiveis):
+            c = possiveis[np.argmin(custos[i, possiveis])]
+            estafeta[i] = c
+            carga[c] += pesos[i]
+    return estafeta
+
+
+# Custo total das entregas atribuídas e número de entregas por atribuir
+def custo_atribuicao(custos, estafeta):
+    atribuidas = estafeta >= 0
+    return float(custos[np.flatnonzero(atribuidas), estafeta[atribuidas]].sum()), int((~atribuidas).sum())
+
+
+# Compara o alocador guloso (allocate_deliveries_to_couriers) com o ótimo (allocate_deliveries_optimally)
+# sobre cópias do serviço, com a mesma matriz de custos. Devolve o custo total, as entregas por atribuir e
+# o tempo de cada alocador (no ótimo sem o cálculo da matriz, que é feito uma vez).
+def comparar_com_greedy(delivery_service):
+    pendentes = delivery_service.pending_deliveries()
+    custos = matriz_custos(delivery_service.graph, delivery_service.couriers, pendentes)
+    indice_estafeta = {courier.courier_id: c for c, courier in enumerate(delivery_service.couriers)}
+
+    # Os grafos são partilhados pelas cópias
+    grafos = [delivery_service.graph] + [courier.graph for courier in delivery_service.couriers]
+    resultados = {}
+    for nome in ("guloso", "otimo"):
+        copia = copy.deepcopy(delivery_service, {id(graph): graph for graph in grafos})
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if nome == "otimo":
+                copia.allocate_deliveries_optimally(custos)
+            else:
+                copia.allocate_deliveries_to_couriers()
+        segundos = time.perf_counter() - inicio
+        atribuidas = {delivery.delivery_id: delivery.assigned_to for delivery in copia.deliveries}
+        estafeta = np.array([indice_estafeta.get(atribuidas[delivery.delivery_id], -1) for delivery in pendentes],
+                            dtype=np.intp)
+        custo, por_atribuir = custo_atribuicao(custos, estafeta)
+        resultados[nome] = {"custo": custo, "por_atribuir": por_atribuir, "segundos": segundos}
+    return resultados
@@ -0,0 +1,156 @@
+import argparse
+import csv
+import json
+import math
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from DeliveryService import DeliveryService
+from parser import carregar_grafo
+
+# Benchmark não interativo dos algoritmos de procura sobre pares origem-destino aleatórios (com seed).
+# Para cada algoritmo mede a latência (p50/p95/p99 com perf_counter), o pico de memória por consulta
+# (tracemalloc, numa segunda passagem para não afetar os tempos), os nós expandidos e o desvio do
+# custo em relação ao ótimo (Dijkstra). Os resultados são escritos em JSON e/ou CSV.
+#
+# Uso: python benchmark.py --grafo grande --pares 200 --seed 1 --json resultados.json --csv resultados.csv
+
+GRAFOS = {
+    "pequeno": ('csv/nodes.csv', 'csv/edges.csv'),
+    "grande": ('csv/nodesBig.csv', 'csv/edgesBig.csv'),
+}
+
+COLUNAS = ["algoritmo", "consultas", "sem_caminho", "p50_ms", "p95_ms", "p99_ms", "media_ms",
+           "pico_memoria_kb", "media_memoria_kb", "nos_expandidos", "desvio_medio", "desvio_maximo", "otimos"]
+
+
+def pares_aleatorios(graph, num_pares, seed):
+    ids = list(graph.nodes)
+    rng = random.Random(seed)
+    return [(rng.choice(ids), rng.choice(ids)) for _ in range(num_pares)]
+
+
+# Custo ótimo de cada par, com um Dijkstra por origem
+def custos_otimos(graph, pares):
+    destinos = {}
+    for start, end in pares:
+        destinos.setdefault(start, []).append(end)
+    otimos = {}
+    for start, ends in destinos.items():
+        matriz = graph.distance_matrix([start], ends)
+        for end, custo in zip(ends, matriz[0]):
+            otimos[(start, end)] = float(custo)
+    return otimos
+
+
+def medir_algoritmo(graph, nome, procura, pares, otimos):
+    latencias, expandidos, desvios = [], [], []
+    sem_caminho = 0
+    for start, end in pares:
+        inicio = time.perf_counter()
+        path, custo, _, _ = procura(start, end)
+        latencias.append(time.perf_counter() - inicio)
+        expandidos.append(graph.nos_expandidos)
+        otimo = otimos[(start, end)]
+        if not path:
+            if otimo != math.inf:
+                sem_caminho += 1
+            continue
+        desvio = (custo - otimo) / otimo if otimo > 0 else 0.0
+        desvios.append(0.0 if abs(desvio) < 1e-9 else desvio)  # erros de arredondamento na soma dos custos
+
+    # Segunda passagem só para a memória: pico alocado durante cada consulta
+    picos = []
+    tracemalloc.start()
+    for start, end in pares:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        procura(start, end)
+        picos.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    latencias_ms = np.array(latencias) * 1000
+    p50, p95, p99 = np.percentile(latencias_ms, [50, 95, 99])
+    return {
+        "algoritmo": nome,
+        "consultas": len(pares),
+        "sem_caminho": sem_caminho,
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "media_ms": round(float(latencias_ms.mean()), 4),
+        "pico_memoria_kb": round(max(picos) / 1024, 2),
+        "media_memoria_kb": round(sum(picos) / len(picos) / 1024, 2),
+        "nos_expandidos": round(sum(expandidos) / len(expandidos), 2),
+        "desvio_medio": round(sum(desvios) / len(desvios), 6) if desvios else 0.0,
+        "desvio_maximo": round(max(desvios), 6) if desvios else 0.0,
+        "otimos": sum(1 for d in desvios if d <= 1e-9),
+    }
+
+
+def run(args):
+    nodes_path, edges_path = GRAFOS[args.grafo]
+    graph = carregar_grafo(nodes_path, edges_path, args.sentido_unico)
+    graph.cache.capacidade = 0  # cada consulta é mesmo executada
+    if args.transporte:
+        graph.apply_traffic_conditions(args.transporte, args.seed)
+    if args.landmarks:
+        graph.preprocess_landmarks()
+    graph.procuras_extra = [nome for nome in DeliveryService.PROCURAS_EXTRA if nome != "CH"]
+    if args.ch:
+        graph.preprocess_ch()
+
+    algoritmos = DeliveryService(graph).algoritmos(graph)
+    if args.algoritmos:
+        algoritmos = [(nome, procura) for nome, procura in algoritmos if nome in args.algoritmos]
+
+    pares = pares_aleatorios(graph, args.pares, args.seed)
+    otimos = custos_otimos(graph, pares)
+
+    resultados = []
+    print(f"Grafo {args.grafo}: {len(graph.nodes)} nós, {graph.csr.num_arcs} arestas, {len(pares)} pares (seed {args.seed})")
+    print(f"{'Algoritmo':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Memória KB':>12}{'Expandidos':>12}{'Desvio':>10}")
+    for nome, procura in algoritmos:
+        r = medir_algoritmo(graph, nome, procura, pares, otimos)
+        resultados.append(r)
+        print(f"{nome:<12}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['pico_memoria_kb']:>12.1f}{r['nos_expandidos']:>12.1f}{r['desvio_medio']:>10.2%}")
+
+    if args.json:
+        relatorio = {
+            "grafo": args.grafo, "nos": len(graph.nodes), "arestas": graph.csr.num_arcs,
+            "pares": len(pares), "seed": args.seed, "transporte": args.transporte,
+            "sentido_unico": args.sentido_unico, "landmarks": args.landmarks,
+            "resultados": resultados,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUNAS)
+            writer.writeheader()
+            writer.writerows(resultados)
+    return resultados
+
+
+def argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark dos algoritmos de procura.")
+    parser.add_argument("--grafo", choices=GRAFOS, default="pequeno")
+    parser.add_argument("--pares", type=int, default=100, help="número de pares origem-destino")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--algoritmos", nargs="*", help="ex.: BFS A* Bi-A* (por omissão todos)")
+    parser.add_argument("--transporte", choices=["Bicicleta", "Moto", "Carro"],
+                        help="aplica um cenário de trânsito com a mesma seed")
+    parser.add_argument("--sentido-unico", action="store_true", help="respeitar ruas de sentido único")
+    parser.add_argument("--landmarks", action="store_true", help="usar a heurística ALT")
+    parser.add_argument("--ch", action="store_true", help="incluir Contraction Hierarchies")
+    parser.add_argument("--json", help="ficheiro JSON de saída")
+    parser.add_argument("--csv", help="ficheiro CSV de saída")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(argumentos())
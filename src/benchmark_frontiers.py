@@ -0,0 +1,49 @@
+import random
+import sys
+import time
+
+from Frontier import FRONTEIRAS
+from Landmarks import LandmarkHeuristic
+from parser import carregar_grafo
+
+# Micro-benchmark das filas de prioridade (Frontier.py) sobre o grafo grande:
+# Dijkstra completo a partir de várias origens e A* (heurística ALT) entre pares aleatórios.
+# Uso: python benchmark_frontiers.py [número de consultas] [seed]
+
+
+def medir(funcao, consultas):
+    inicio = time.perf_counter()
+    resultados = [funcao(*consulta) for consulta in consultas]
+    return time.perf_counter() - inicio, resultados
+
+
+def run(csv_nodes_path, csv_connections_path, num_consultas=50, seed=0):
+    graph = carregar_grafo(csv_nodes_path, csv_connections_path)
+    graph.apply_traffic_conditions('Carro', seed)
+    csr, custos = graph.csr, graph.custos
+    landmarks = graph.preprocess_landmarks()
+    fator = LandmarkHeuristic.fator_minimo(custos, csr.lengths)
+
+    rng = random.Random(seed)
+    origens = [(rng.randrange(csr.num_nodes),) for _ in range(max(1, num_consultas // 10))]
+    pares = [(rng.randrange(csr.num_nodes), rng.randrange(csr.num_nodes)) for _ in range(num_consultas)]
+    heuristicas = {j: landmarks.heuristic_to(j, fator) for _, j in pares}
+
+    print(f"Grafo: {csr.num_nodes} nós, {csr.num_arcs} arestas")
+    print(f"{'Fila':<10}{'Dijkstra (ms)':>16}{'A* (ms)':>12}")
+    referencia = None
+    for nome, fronteira in FRONTEIRAS.items():
+        t_dijkstra, distancias = medir(lambda s: csr.dijkstra(s, custos, frontier=fronteira), origens)
+        t_a_star, caminhos = medir(lambda s, t: csr.a_star(s, t, custos, heuristicas[t], fronteira), pares)
+        custos_a_star = [round(c, 6) for _, c, _, _ in caminhos]
+        if referencia is None:
+            referencia = (distancias, custos_a_star)
+        elif (distancias, custos_a_star) != referencia:
+            print(f"Aviso: {nome} devolveu custos diferentes da heap binária.")
+        print(f"{nome:<10}{t_dijkstra / len(origens) * 1000:>16.2f}{t_a_star / len(pares) * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    num_consultas = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    run('csv/nodesBig.csv', 'csv/edgesBig.csv', num_consultas, seed)
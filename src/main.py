@@ -2,15 +2,27 @@ from Delivery import Delivery
 from Courier import Courier
 from Graph import Graph
 from DeliveryService import DeliveryService
-from parser import load_couriers_from_csv, load_deliveries_from_csv, read_edges, read_nodes
+from parser import carregar_grafo, load_couriers_from_csv, load_deliveries_from_csv
+from simulation import simular_rotas, concluir_entregas, atualizar_scores
+from assignment import comparar_com_greedy
 import tkinter as tk
 import matplotlib.pyplot as plt
 
-root = tk.Tk()
-root.title("Encomenda")
-root.withdraw()
+# Janela Tk principal, criada em run(). Não é criada ao importar este ficheiro, porque os processos
+# do multiprocessing iniciados com spawn voltam a importá-lo
+root = None
 
-# Grafo para indicarmos no mapa o ponto de entrega das encomendas
+LARGURA_CANVAS = 800
+ALTURA_CANVAS = 600
+ZOOM_MAXIMO = 200
+MAX_ARESTAS_DESENHADAS = 2000  # acima disto só são desenhadas as estradas maiores
+MAX_NOS_DESENHADOS = 1500  # acima disto os nós não são desenhados (o clique usa o índice espacial)
+MAX_ROTULOS = 300  # os nomes das ruas só aparecem com o zoom suficiente para haver até este número de ruas
+
+
+# Grafo para indicarmos no mapa o ponto de entrega das encomendas. Só é desenhado o que está na área
+# visível (roda do rato: zoom; botão direito: arrastar; teclas + - e 0), com geometrias simplificadas e
+# sem rótulos quando o zoom é pequeno, por isso o tempo de abrir a janela não depende do tamanho do grafo.
 class GraphApp:
     def __init__(self, master, graph):
         self.master = master
@@ -18,52 +30,108 @@ class GraphApp:
         self.setup_ui(master)
     def setup_ui(self, master):
         master.title("Seleção de Localização de Encomendas no Grafo")
-        self.canvas = tk.Canvas(master, width=800, height=600)
+        self.canvas = tk.Canvas(master, width=LARGURA_CANVAS, height=ALTURA_CANVAS)
         self.canvas.pack()
         self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(1.25, event.x, event.y))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(0.8, event.x, event.y))
+        self.canvas.bind("<ButtonPress-3>", self.start_pan)
+        self.canvas.bind("<B3-Motion>", self.pan)
+        self.canvas.bind("<ButtonRelease-3>", lambda event: self.draw_graph())
+        master.bind("<plus>", lambda event: self.zoom(1.25, LARGURA_CANVAS / 2, ALTURA_CANVAS / 2))
+        master.bind("<minus>", lambda event: self.zoom(0.8, LARGURA_CANVAS / 2, ALTURA_CANVAS / 2))
+        master.bind("<Key-0>", lambda event: self.reset_view())
         self.confirm_button = tk.Button(master, text="Confirmar Seleção", command=self.confirm_selection)
         self.confirm_button.pack()
-        self.instruction_label = tk.Label(master, text="Clique no mapa para selecionar o nó de partida")
+        self.instruction_label = tk.Label(master, text="Clique no mapa para selecionar o nó de partida "
+                                                       "(roda do rato: zoom; botão direito: arrastar)")
         self.instruction_label.pack()
-        self.draw_graph()
+        self.calculate_boundaries()
+        self.reset_view()
 
     def normalize_coordinates(self, x, y):
-        norm_x = (x - self.min_x) / (self.max_x - self.min_x) * 800
-        norm_y = (y - self.min_y) / (self.max_y - self.min_y) * 600
+        norm_x = (x - self.view_min_x) / (self.view_max_x - self.view_min_x) * LARGURA_CANVAS
+        norm_y = (y - self.view_min_y) / (self.view_max_y - self.view_min_y) * ALTURA_CANVAS
         return norm_x, norm_y
 
     def draw_graph(self):
-        self.calculate_boundaries()
-        for node_id, node in self.graph.nodes.items():
-            x, y = self.normalize_coordinates(*node.coordinates)
-            self.canvas.create_oval(x - 5, y - 5, x + 5, y + 5, fill="blue")
-
-        for node_id, edges in self.graph.edges.items():
-            for edge in edges:
-                self.draw_edge(edge)
+        self.canvas.delete("all")
+        escala = ((self.view_max_x - self.view_min_x) / LARGURA_CANVAS,
+                  (self.view_max_y - self.view_min_y) / ALTURA_CANVAS)
+        self.nivel = Graph.nivel_detalhe(max(escala))  # geometrias simplificadas para a escala do canvas
+        area = (self.view_min_x, self.view_min_y, self.view_max_x, self.view_max_y)
+
+        nodes = self.graph.nos_no_retangulo(*area)
+        if len(nodes) <= MAX_NOS_DESENHADOS:
+            for node_id in nodes:
+                x, y = self.normalize_coordinates(*self.graph.nodes[node_id].coordinates)
+                self.canvas.create_oval(x - 5, y - 5, x + 5, y + 5, fill="blue")
+
+        edges = self.graph.arestas_no_retangulo(*area, escala, MAX_ARESTAS_DESENHADAS)
+        self.show_labels = len(edges) <= MAX_ROTULOS
+        for edge in edges:
+            self.draw_edge(edge)
 
     def calculate_boundaries(self):
         x_coords, y_coords = zip(*[node.coordinates for node in self.graph.nodes.values()])
         self.min_x, self.max_x = min(x_coords), max(x_coords)
         self.min_y, self.max_y = min(y_coords), max(y_coords)
 
+    def reset_view(self):
+        self.zoom_level = 1
+        self.view_min_x, self.view_max_x = self.min_x, self.max_x
+        self.view_min_y, self.view_max_y = self.min_y, self.max_y
+        self.draw_graph()
+
+    # Zoom centrado no ponto (x, y) do canvas, que fica no mesmo sítio do ecrã
+    def zoom(self, fator, x, y):
+        zoom_level = min(max(self.zoom_level * fator, 1), ZOOM_MAXIMO)
+        fator = zoom_level / self.zoom_level
+        if fator == 1:
+            return
+        if zoom_level == 1:
+            self.reset_view()
+            return
+        map_x, map_y = self.denormalize_coordinates(x, y)
+        self.zoom_level = zoom_level
+        self.view_min_x = map_x - (map_x - self.view_min_x) / fator
+        self.view_max_x = map_x + (self.view_max_x - map_x) / fator
+        self.view_min_y = map_y - (map_y - self.view_min_y) / fator
+        self.view_max_y = map_y + (self.view_max_y - map_y) / fator
+        self.draw_graph()
+
+    def on_mouse_wheel(self, event):
+        self.zoom(1.25 if event.delta > 0 else 0.8, event.x, event.y)
+
+    def start_pan(self, event):
+        self.pan_x, self.pan_y = event.x, event.y
+
+    # Enquanto se arrasta só se movem os itens já desenhados; ao largar o botão a área visível é redesenhada
+    def pan(self, event):
+        dx, dy = event.x - self.pan_x, event.y - self.pan_y
+        self.pan_x, self.pan_y = event.x, event.y
+        self.canvas.move("all", dx, dy)
+        desloc_x = dx / LARGURA_CANVAS * (self.view_max_x - self.view_min_x)
+        desloc_y = dy / ALTURA_CANVAS * (self.view_max_y - self.view_min_y)
+        self.view_min_x -= desloc_x
+        self.view_max_x -= desloc_x
+        self.view_min_y -= desloc_y
+        self.view_max_y -= desloc_y
+
     def draw_edge(self, edge):
-        if edge.geometry:
-            points = Graph.parse_linestring(edge.geometry)
-            norm_points = [self.normalize_coordinates(x, y) for x, y in points]
-            flat_points = [val for pair in norm_points for val in pair]
-
-            if len(flat_points) >= 4:
-                self.canvas.create_line(*flat_points, fill="black")
-                mid_index = len(norm_points) // 2
-                midpoint_x, midpoint_y = norm_points[mid_index]
+        points = list(zip(*self.graph.coordenadas_aresta(edge, self.nivel)))
+        norm_points = [self.normalize_coordinates(x, y) for x, y in points]
+        flat_points = [val for pair in norm_points for val in pair]
+
+        if len(flat_points) >= 4:
+            self.canvas.create_line(*flat_points, fill="black")
+            if self.show_labels:
+                if len(norm_points) == 2:
+                    midpoint_x, midpoint_y = Graph.midpoint(*norm_points)
+                else:
+                    midpoint_x, midpoint_y = norm_points[len(norm_points) // 2]
                 self.canvas.create_text(midpoint_x, midpoint_y, text=edge.name, fill="black", font=("Arial", 5))
-        else:
-            start_x, start_y = self.normalize_coordinates(*self.graph.nodes[edge.u].coordinates)
-            end_x, end_y = self.normalize_coordinates(*self.graph.nodes[edge.v].coordinates)
-            self.canvas.create_line(start_x, start_y, end_x, end_y, fill="black")
-            midpoint_x, midpoint_y = (start_x + end_x) / 2, (start_y + end_y) / 2
-            self.canvas.create_text(midpoint_x, midpoint_y, text=edge.name, fill="black", font=("Arial", 5))
 
     def on_canvas_click(self, event):
         if self.selected_destination_node is not None:
@@ -79,16 +147,14 @@ class GraphApp:
     def get_selected_nodes(self):
         return self.selected_destination_node
 
+    def denormalize_coordinates(self, norm_x, norm_y):
+        x = self.view_min_x + norm_x / LARGURA_CANVAS * (self.view_max_x - self.view_min_x)
+        y = self.view_min_y + norm_y / ALTURA_CANVAS * (self.view_max_y - self.view_min_y)
+        return x, y
+
+    # Converte o clique para coordenadas do mapa e consulta o índice espacial do grafo
     def find_closest_node(self, x, y):
-        closest_node = None
-        min_dist = float('inf')
-        for node_id, node in self.graph.nodes.items():
-            norm_x, norm_y = self.normalize_coordinates(node.coordinates[0], node.coordinates[1])
-            dist = ((x - norm_x) ** 2 + (y - norm_y) ** 2) ** 0.5
-            if dist < min_dist:
-                min_dist = dist
-                closest_node = node_id
-        return closest_node
+        return self.graph.nearest_node(*self.denormalize_coordinates(x, y))
 
     def confirm_selection(self):
         self.selection_confirmed = True
@@ -190,6 +256,9 @@ def menu_grafo(graph, central):
         print("5. Cortar Estrada")
         print("6. Adicionar Transito")
         print("7. Atualizar ponto de recolha")
+        print("8. Pré-processar Contraction Hierarchies")
+        print("9. Pré-processar landmarks (heurística ALT)")
+        print("10. Incluir procuras bidirecionais nas rotas")
         print("0. Voltar ao Menu Principal")
         escolha = input("Escolha uma opção: ")
 
@@ -202,11 +271,8 @@ def menu_grafo(graph, central):
         elif escolha == '4':
             nodes_filepath = input("Insira o path dos nodes: ")
             edges_filepath = input("Insira o path das edges: ")
-            graph = Graph()
-            nodes = read_nodes(nodes_filepath)
-            for node in nodes.values():
-                graph.add_node(node)
-            read_edges(edges_filepath, graph)
+            sentido_unico = input("Respeitar ruas de sentido único? (s/n): ").strip().lower() == 's'
+            graph = carregar_grafo(nodes_filepath, edges_filepath, sentido_unico)
             print("Grafo carregado com sucesso!")
         elif escolha == '5':
             graph.cortar_estrada()
@@ -218,46 +284,36 @@ def menu_grafo(graph, central):
                 central = novo_ponto
             else:
                 print("Ponto de recolha não encontrado no grafo.")
+        elif escolha == '8':
+            graph.preprocess_ch()
+            print("Contraction Hierarchies calculadas. A procura CH será incluída nas rotas.")
+        elif escolha == '9':
+            graph.preprocess_landmarks()
+            print("Landmarks calculados. O A* e a procura gulosa passam a usar a heurística ALT.")
+        elif escolha == '10':
+            for nome in ("Bi-Dijkstra", "Bi-A*"):
+                if nome not in graph.procuras_extra:
+                    graph.procuras_extra.append(nome)
+            print("Procuras bidirecionais incluídas nas rotas.")
         elif escolha == '0':
             break
     return graph,central
 
 
-def simulate(delivery_service):
-    custos_totais = {alg: 0 for alg in ["BFS", "DFS", "Greedy", "A*"]}
-    tempos_totais = {alg: 0 for alg in ["BFS", "DFS", "Greedy", "A*"]}
-    espacos_totais = {alg: 0 for alg in ["BFS", "DFS", "Greedy", "A*"]}
-    numero_entregas = 0
-
-    for courier in delivery_service.couriers:
-        courier.graph = delivery_service.graph.clone()
-        courier.graph.apply_traffic_conditions(courier.transport_type)
-
-    for courier in delivery_service.couriers:
-        _, _, resultados = delivery_service.calculate_route_for_courier(courier)
-        numero_entregas += len(courier.deliveries)
-        for alg, resultado in resultados.items():
-            custos_totais[alg] += resultado['custo']
-            tempos_totais[alg] += resultado['tempo']
-            espacos_totais[alg] += resultado['espaco']
-
-    custos_medios = {alg: custo / numero_entregas for alg, custo in custos_totais.items()}
-    tempos_medios = {alg: tempo / numero_entregas for alg, tempo in tempos_totais.items()}
-    espacos_medios = {alg: espaco / numero_entregas for alg, espaco in espacos_totais.items()}
+# Com uma seed, todos os estafetas do mesmo tipo de transporte partilham o mesmo cenário de trânsito
+# Com paralelo, as rotas dos estafetas são calculadas num conjunto de processos (ver simulation.py)
+# Com otimizar, a ordem das entregas de cada estafeta é otimizada antes do cálculo das rotas
+def simulate(delivery_service, seed=None, paralelo=False, otimizar=False):
+    _, custos_medios, tempos_medios, espacos_medios, _ = simular_rotas(delivery_service, seed, paralelo,
+                                                                    otimizar=otimizar)
 
     criar_grafico_comparativo(custos_medios, tempos_medios, espacos_medios)
 
-    for delivery in delivery_service.deliveries:
-        if delivery.status == 'Atribuída':
-            courier = next((c for c in delivery_service.couriers if c.courier_id == delivery.assigned_to), None)
-            delivery.update_status('Concluída')
-            delivery.calcular_preco(courier.transport_type)
+    concluir_entregas(delivery_service)
     # Avaliação das Entregas
     delivery_service.evaluate_deliveries()
     # Atualização do Score dos Estafetas
-    for courier in delivery_service.couriers:
-        courier.update_score()
-        print(f"Score atualizado do estafeta {courier.courier_id}: {courier.score:.2f}")
+    atualizar_scores(delivery_service)
 
 
 def criar_grafico_comparativo(custos_medios, tempos_medios, espacos_medios):
@@ -265,23 +321,24 @@ def criar_grafico_comparativo(custos_medios, tempos_medios, espacos_medios):
     custos = list(custos_medios.values())
     tempos = list(tempos_medios.values())
     espacos = list(espacos_medios.values())
+    cores = ['blue', 'green', 'purple', 'red', 'brown', 'pink', 'cyan'][:len(algoritmos)]
 
     fig, axes = plt.subplots(nrows=1, ncols=3, figsize=(15, 5))
 
     # Gráfico de Custo Médio
-    axes[0].bar(algoritmos, custos, color=['blue', 'green', 'purple', 'red'])
+    axes[0].bar(algoritmos, custos, color=cores)
     axes[0].set_title('Custo')
     axes[0].set_xlabel('Algoritmos')
     axes[0].set_ylabel('Custo')
 
     # Gráfico de Tempo Médio
-    axes[1].bar(algoritmos, tempos, color=['blue', 'green', 'purple', 'red'])
+    axes[1].bar(algoritmos, tempos, color=cores)
     axes[1].set_title('Tempo')
     axes[1].set_xlabel('Algoritmos')
     axes[1].set_ylabel('Tempo')
 
     # Gráfico de Espaço Médio
-    axes[2].bar(algoritmos, espacos, color=['blue', 'green', 'purple', 'red'])
+    axes[2].bar(algoritmos, espacos, color=cores)
     axes[2].set_title('Espaço')
     axes[2].set_xlabel('Algoritmos')
     axes[2].set_ylabel('Espaço')
@@ -357,11 +414,21 @@ def menu(graph):
                     delivery_service.add_delivery(encomenda)
                 for estafeta in lista_estafetas:
                     delivery_service.add_courier(estafeta)
-                delivery_service.allocate_deliveries_to_couriers()
+                modo = input("Atribuição por prazo (1) ou ótima, com o menor custo total (2)? ").strip()
+                if modo == '2':
+                    comparacao = comparar_com_greedy(delivery_service)
+                    custo, por_atribuir = delivery_service.allocate_deliveries_optimally()
+                    guloso = comparacao['guloso']
+                    print(f"Custo total: {custo:.2f}h, {por_atribuir} por atribuir "
+                          f"(atribuição por prazo: {guloso['custo']:.2f}h, {guloso['por_atribuir']} por atribuir)")
+                else:
+                    delivery_service.allocate_deliveries_to_couriers()
             print("Entregas atribuídas aos estafetas.")
         elif escolha == '7':
+            paralelo = input("Calcular as rotas dos estafetas em paralelo? (s/n): ").strip().lower() == 's'
+            otimizar = input("Otimizar a ordem das entregas de cada estafeta? (s/n): ").strip().lower() == 's'
             try:
-                simulate(delivery_service)
+                simulate(delivery_service, paralelo=paralelo, otimizar=otimizar)
             except Exception as e:
                 print(f"Erro: {e}")
         elif escolha == '8':
@@ -376,13 +443,13 @@ def menu(graph):
 
 
 def run(csv_nodes_path, csv_connections_path):
+    global root
+    root = tk.Tk()
+    root.title("Encomenda")
+    root.withdraw()
 
-    # Construir grafo com base nos csv
-    graph = Graph()
-    nodes = read_nodes(csv_nodes_path)
-    for node in nodes.values():
-        graph.add_node(node)
-    read_edges(csv_connections_path, graph)
+    # Construir grafo com base nos csv (ou no snapshot binário, se estiver atualizado)
+    graph = carregar_grafo(csv_nodes_path, csv_connections_path)
 
     menu(graph)
 
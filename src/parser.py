@@ -1,4 +1,5 @@
 import csv
+import os
 from Node import Node
 from Graph import Edge
 from Courier import Courier
@@ -38,6 +39,40 @@ def read_edges(csv_path, graph):
             else:
                 print(f"Linha inválida: {row}")
 
+# Snapshot binário associado a um par de CSVs (ex.: csv/edges.csv -> csv/edges.snapshot)
+def snapshot_path(csv_connections_path, sentido_unico=False):
+    sufixo = '.oneway.snapshot' if sentido_unico else '.snapshot'
+    return os.path.splitext(csv_connections_path)[0] + sufixo
+
+
+# Carrega o grafo a partir do snapshot quando este é mais recente que os CSVs;
+# caso contrário lê os CSVs e volta a gerar o snapshot
+def carregar_grafo(csv_nodes_path, csv_connections_path, sentido_unico=False):
+    snapshot = snapshot_path(csv_connections_path, sentido_unico)
+    try:
+        atualizado = os.path.getmtime(snapshot) >= max(os.path.getmtime(csv_nodes_path),
+                                                       os.path.getmtime(csv_connections_path))
+    except OSError:
+        atualizado = False
+    if atualizado:
+        try:
+            return Graph.Graph.load_snapshot(snapshot)
+        except Exception as e:
+            # Snapshot ilegível (truncado, corrompido ou de outra versão): é gerado de novo a partir dos CSVs
+            print(f"Snapshot do grafo inválido ({e}); a ler os CSVs.")
+
+    graph = Graph.Graph(sentido_unico)
+    nodes = read_nodes(csv_nodes_path)
+    for node in nodes.values():
+        graph.add_node(node)
+    read_edges(csv_connections_path, graph)
+
+    try:
+        graph.save_snapshot(snapshot)
+    except OSError as e:
+        print(f"Não foi possível guardar o snapshot do grafo: {e}")
+    return graph
+
 def load_couriers_from_csv(filepath, lista_estafetas, graph, central_collection_point):
     with open(filepath, newline='', encoding='utf-8') as csvfile:
         reader = csv.reader(csvfile)
@@ -0,0 +1,266 @@
+import argparse
+import atexit
+import contextlib
+import copy
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from DeliveryService import DeliveryService
+from SharedGraph import SharedGraph
+from assignment import comparar_com_greedy
+from parser import carregar_grafo, load_couriers_from_csv, load_deliveries_from_csv
+
+# Grafo partilhado e DeliveryService de cada processo
+_partilhado = None
+_servico = None
+
+
+def _iniciar_processo(nome, procuras_extra):
+    global _partilhado, _servico
+    _partilhado = SharedGraph.attach(nome)
+    graph = _partilhado.graph
+    graph.procuras_extra = list(procuras_extra)
+    _servico = DeliveryService(graph)
+    atexit.register(_terminar_processo)
+
+
+# Com spawn os processos terminam normalmente; o grafo tem de ser largado antes de fechar o bloco de
+# memória partilhada, que não pode ser fechado enquanto houver arrays a apontar para ele
+def _terminar_processo():
+    global _partilhado, _servico
+    partilhado, _partilhado, _servico = _partilhado, None, None
+    partilhado.close()
+
+
+# Calcula as rotas de um estafeta num processo; o texto impresso é devolvido para ser mostrado
+# pela ordem dos estafetas, tal como na simulação em série. Devolve também a utilização da cache de
+# caminhos do processo durante este estafeta
+def _rotas_estafeta(courier, custos):
+    courier.graph = _servico.graph.clone(custos)
+    cache = courier.graph.cache
+    antes = cache.estatisticas()
+    saida = io.StringIO()
+    with contextlib.redirect_stdout(saida):
+        best_algorithm, best_path, resultados, paths = _servico.calcular_rotas(courier)
+    tempos = {delivery.delivery_id: delivery.tempo_entrega for delivery in courier.deliveries}
+    depois = cache.estatisticas()
+    estatisticas = {chave: depois[chave] - antes[chave] for chave in ("hits", "misses", "evictions")}
+    estatisticas.update(processo=os.getpid(), entradas=depois["entradas"], capacidade=depois["capacidade"])
+    return saida.getvalue(), best_algorithm, best_path, resultados, paths, tempos, estatisticas
+
+
+# Soma a utilização das caches dos processos; entradas e capacidade são as do conjunto dos processos
+def _juntar_estatisticas(por_estafeta):
+    total = {"hits": 0, "misses": 0, "evictions": 0}
+    ultimas = {}
+    for estatisticas in por_estafeta:
+        for chave in total:
+            total[chave] += estatisticas[chave]
+        ultimas[estatisticas["processo"]] = estatisticas
+    total["entradas"] = sum(e["entradas"] for e in ultimas.values())
+    total["capacidade"] = sum(e["capacidade"] for e in ultimas.values())
+    total["processos"] = len(ultimas)
+    return total
+
+
+# Os processos são criados com fork só no Linux (não é preciso voltar a importar os módulos). Noutros
+# sistemas o fork não é seguro depois de iniciado o Tk (ex.: no macOS), por isso usa-se spawn: os processos
+# importam só este módulo e o ficheiro principal, que não cria a janela ao ser importado (ver main.py)
+def _contexto():
+    if sys.platform.startswith('linux'):
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+# Versão em paralelo de calculate_route_for_courier para todos os estafetas. Cada estafeta já deve
+# ter o seu grafo (clone com o cenário de trânsito); o grafo base é publicado em memória partilhada
+# e por estafeta só seguem os custos. Os resultados são devolvidos pela ordem dos estafetas, com os
+# desenhos feitos no processo principal, junto com a utilização das caches dos processos.
+def calculate_routes_in_parallel(delivery_service, max_workers=None, desenhar=True):
+    couriers = delivery_service.couriers
+    graph = delivery_service.graph
+    # As hierarquias não são enviadas aos processos e os custos de cada estafeta chegam como uma cópia,
+    # por isso cada processo teria de construir uma hierarquia por estafeta
+    procuras_extra = [nome for nome in graph.procuras_extra if nome != "CH"]
+    if "CH" in graph.procuras_extra:
+        print("Aviso: CH não incluída nas rotas calculadas em paralelo.")
+    with SharedGraph.publish(graph) as partilhado, \
+            ProcessPoolExecutor(max_workers=max_workers, mp_context=_contexto(), initializer=_iniciar_processo,
+                                initargs=(partilhado.name, procuras_extra)) as executor:
+        futuros = []
+        for courier in couriers:
+            copia = copy.copy(courier)
+            copia.graph = None
+            futuros.append(executor.submit(_rotas_estafeta, copia, courier.graph.custos))
+
+        resultados = []
+        estatisticas = []
+        for courier, futuro in zip(couriers, futuros):
+            texto, best_algorithm, best_path, resultados_estafeta, paths, tempos, cache = futuro.result()
+            estatisticas.append(cache)
+            print(texto, end='')
+            for delivery in courier.deliveries:
+                delivery.tempo_entrega = tempos[delivery.delivery_id]
+            if desenhar:
+                delivery_service.draw_paths_on_graph(courier.graph, courier, paths, best_algorithm, best_path)
+            resultados.append((best_algorithm, best_path, resultados_estafeta))
+    return resultados, _juntar_estatisticas(estatisticas)
+
+
+# Prepara o grafo de cada estafeta (cenário de trânsito; com uma seed, todos os estafetas do mesmo tipo
+# de transporte partilham o mesmo cenário), calcula as rotas e devolve as rotas de cada estafeta e as
+# médias por entrega do custo, tempo e espaço de cada algoritmo (sobre as entregas dos estafetas em que
+# o algoritmo foi usado, ex.: a CH só em alguns) e a utilização da cache de caminhos (em paralelo, a
+# soma das caches dos processos). Com otimizar, a ordem das entregas de
+# cada estafeta é otimizada antes (ver DeliveryService.optimize_delivery_order).
+def simular_rotas(delivery_service, seed=None, paralelo=False, desenhar=True, otimizar=False):
+    custos_totais = {}
+    tempos_totais = {}
+    espacos_totais = {}
+    numero_entregas = {}
+
+    for courier in delivery_service.couriers:
+        courier.graph = delivery_service.graph.clone()
+        courier.graph.apply_traffic_conditions(courier.transport_type, seed)
+    if otimizar:
+        delivery_service.optimize_delivery_order()
+
+    if paralelo:
+        rotas, cache = calculate_routes_in_parallel(delivery_service, desenhar=desenhar)
+    else:
+        rotas = [delivery_service.calculate_route_for_courier(courier, desenhar)
+                 for courier in delivery_service.couriers]
+        cache = delivery_service.graph.cache.estatisticas()
+
+    for courier, (_, _, resultados) in zip(delivery_service.couriers, rotas):
+        for alg, resultado in resultados.items():
+            numero_entregas[alg] = numero_entregas.get(alg, 0) + len(courier.deliveries)
+            custos_totais[alg] = custos_totais.get(alg, 0) + resultado['custo']
+            tempos_totais[alg] = tempos_totais.get(alg, 0) + resultado['tempo']
+            espacos_totais[alg] = espacos_totais.get(alg, 0) + resultado['espaco']
+
+    custos_medios = {alg: custo / max(numero_entregas[alg], 1) for alg, custo in custos_totais.items()}
+    tempos_medios = {alg: tempo / max(numero_entregas[alg], 1) for alg, tempo in tempos_totais.items()}
+    espacos_medios = {alg: espaco / max(numero_entregas[alg], 1) for alg, espaco in espacos_totais.items()}
+
+    print(f"Cache de caminhos: {cache['hits']} hits, {cache['misses']} misses, {cache['evictions']} evictions "
+          f"({cache['entradas']}/{cache['capacidade']} entradas)")
+    return rotas, custos_medios, tempos_medios, espacos_medios, cache
+
+
+# Marca as entregas atribuídas como concluídas e calcula o preço
+def concluir_entregas(delivery_service):
+    for delivery in delivery_service.deliveries:
+        if delivery.status == 'Atribuída':
+            courier = delivery_service.get_courier(delivery.assigned_to)
+            delivery.update_status('Concluída')
+            delivery.calcular_preco(courier.transport_type)
+
+
+def atualizar_scores(delivery_service):
+    for courier in delivery_service.couriers:
+        courier.update_score()
+        print(f"Score atualizado do estafeta {courier.courier_id}: {courier.score:.2f}")
+
+
+# Avaliações simuladas (0-5) com seed: entregas dentro do prazo recebem 4 ou 5 estrelas;
+# as atrasadas perdem estrelas proporcionalmente ao atraso
+def modelo_avaliacoes(seed=None):
+    rng = random.Random(seed)
+
+    def avaliar(delivery):
+        prazo = float(delivery.deadline)
+        tempo = delivery.tempo_entrega
+        if tempo is None or math.isinf(tempo):
+            return 0
+        if tempo <= prazo:
+            return rng.choice((4, 5, 5))
+        atraso = (tempo - prazo) / prazo if prazo > 0 else 1.0
+        return max(0, min(5, 4 - int(2 * atraso) - rng.randint(0, 1)))
+
+    return avaliar
+
+
+# Execução sem desenhos nem input: atribuição, rotas, preços, avaliações e scores. avaliacoes é uma
+# função ou dicionário como em evaluate_deliveries; por omissão usa-se modelo_avaliacoes(seed).
+# alocador é "guloso" (allocate_deliveries_to_couriers) ou "otimo" (allocate_deliveries_optimally); com
+# comparar o resultado inclui a comparação dos dois (ver assignment.comparar_com_greedy). Com otimizar, a
+# ordem das entregas de cada estafeta é otimizada antes do cálculo das rotas.
+# Com silencioso o texto impresso é descartado. Devolve os resultados num dicionário.
+def simular_em_lote(delivery_service, seed=None, avaliacoes=None, paralelo=False, silencioso=True,
+                    alocador="guloso", comparar=False, otimizar=False):
+    if avaliacoes is None:
+        avaliacoes = modelo_avaliacoes(seed)
+    comparacao = comparar_com_greedy(delivery_service) if comparar else None
+    saida = contextlib.redirect_stdout(io.StringIO()) if silencioso else contextlib.nullcontext()
+    with saida:
+        if alocador == "otimo":
+            delivery_service.allocate_deliveries_optimally()
+        else:
+            delivery_service.allocate_deliveries_to_couriers()
+        rotas, custos_medios, tempos_medios, espacos_medios, cache = simular_rotas(delivery_service, seed, paralelo,
+                                                                            desenhar=False, otimizar=otimizar)
+        concluir_entregas(delivery_service)
+        delivery_service.evaluate_deliveries(avaliacoes)
+        atualizar_scores(delivery_service)
+
+    resultado = {
+        "alocador": alocador,
+        "algoritmos": {alg: {"custo": custos_medios[alg], "tempo": tempos_medios[alg], "espaco": espacos_medios[alg]}
+                       for alg in custos_medios},
+        "estafetas": [{"id": courier.courier_id, "transporte": courier.transport_type, "score": courier.score,
+                       "melhor_algoritmo": best_algorithm, "caminho": best_path,
+                       "entregas": [delivery.delivery_id for delivery in courier.deliveries]}
+                      for courier, (best_algorithm, best_path, _) in zip(delivery_service.couriers, rotas)],
+        "entregas": [{"id": delivery.delivery_id, "destino": delivery.destination_node, "estado": delivery.status,
+                      "estafeta": delivery.assigned_to, "prazo": delivery.deadline,
+                      "tempo_entrega": delivery.tempo_entrega, "preco": delivery.preco,
+                      "avaliacao": delivery.customer_rating}
+                     for delivery in delivery_service.deliveries],
+        "cache": cache,
+    }
+    if comparacao is not None:
+        resultado["comparacao_alocadores"] = comparacao
+    return resultado
+
+
+GRAFOS = {
+    "pequeno": ('csv/nodes.csv', 'csv/edges.csv', 'csv/estafetas.csv', 'csv/encomendas.csv'),
+    "grande": ('csv/nodesBig.csv', 'csv/edgesBig.csv', 'csv/estafetasBig.csv', 'csv/encomendasBig.csv'),
+}
+
+
+# Uso: python simulation.py --grafo grande --seed 1 --json resultados.json
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulação em lote, sem desenhos nem input.")
+    parser.add_argument("--grafo", choices=GRAFOS, default="pequeno")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ponto-recolha", default='245058608')
+    parser.add_argument("--paralelo", action="store_true")
+    parser.add_argument("--alocador", choices=["guloso", "otimo"], default="guloso")
+    parser.add_argument("--comparar", action="store_true", help="comparar os alocadores guloso e ótimo")
+    parser.add_argument("--otimizar-rotas", action="store_true", help="otimizar a ordem das entregas de cada estafeta")
+    parser.add_argument("--json", help="ficheiro JSON de saída (por omissão escreve no ecrã)")
+    args = parser.parse_args()
+
+    nodes_path, edges_path, estafetas_path, encomendas_path = GRAFOS[args.grafo]
+    service = DeliveryService(carregar_grafo(nodes_path, edges_path))
+    for estafeta in load_couriers_from_csv(estafetas_path, [], service.graph, args.ponto_recolha):
+        service.add_courier(estafeta)
+    for encomenda in load_deliveries_from_csv(encomendas_path, [], args.ponto_recolha):
+        service.add_delivery(encomenda)
+
+    resultado = simular_em_lote(service, args.seed, paralelo=args.paralelo, alocador=args.alocador,
+                                comparar=args.comparar, otimizar=args.otimizar_rotas)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False, default=str)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)